@@ -33,11 +33,11 @@ import src.cava.cava_init as cava_init
 from src.config.config_loader import load_config
 from src.cava.cava_init import initialize_plan
 from src.ui_controls import on_pause_button_clicked, on_back_button_clicked, on_skip_button_clicked
-from src.visualizers.bars import BarsVisualizer
-from src.visualizers.lines import LinesVisualizer
+from src.visualizers import get_visualizer_class
 from src.mpris_service import get_mpris_service
 from src.update_info import update_info, update_progress
 from src.cava.run_cava import run_cava
+from src.frame_mailbox import FrameMailbox
 import time
 start_time = time.time()
 
@@ -47,10 +47,6 @@ if getattr(sys, 'frozen', False):
 else:
     base_path = os.path.dirname(os.path.abspath(__file__))
 
-# Initialize cavacore
-cava_init.initialize_cava(base_path)
-cava_lib = cava_init.cava_lib
-
 config = configparser.ConfigParser()
 
 
@@ -58,6 +54,18 @@ config = configparser.ConfigParser()
 # Load configuration
 gvis_config = load_config()
 
+# has to happen before any OpenGL context is made
+if gvis_config['shader_cache']:
+    from src.visualizers.program_cache import enable_driver_cache
+    enable_driver_cache()
+
+# Initialize cavacore (or the numpy engine if there is no cavacore for this machine)
+try:
+    cava_lib = cava_init.load_spectrum_engine(base_path, gvis_config['spectrum_engine'])
+except OSError as e:
+    print(e)
+    exit(1)
+
 # Extract configuration values
 number_of_bars = gvis_config['number_of_bars']
 rate = gvis_config['rate']
@@ -67,8 +75,21 @@ noise_reduction = gvis_config['noise_reduction']
 low_cut_off = gvis_config['low_cut_off']
 high_cut_off = gvis_config['high_cut_off']
 buffer_size = gvis_config['buffer_size']
+adaptive_buffer = gvis_config['adaptive_buffer']
+target_latency = gvis_config['target_latency']
 input_source = gvis_config['input_source']
+input_pacing = gvis_config['input_pacing']
+input_gains = gvis_config['input_gains']
+stall_timeout = gvis_config['stall_timeout']
+stall_restart = gvis_config['stall_restart']
+use_dsp_process = gvis_config['dsp_process']
+record_path = gvis_config['record_path']
+replay_speed = gvis_config['replay_speed']
+replay_frames_path = gvis_config['replay_frames']
+postprocess_steps = gvis_config['postprocess']
 vis_type = gvis_config['vis_type']
+render_backend = gvis_config['render_backend']
+redraw_threshold = gvis_config['redraw_threshold']
 fill = gvis_config['fill']
 gradient = gvis_config['gradient']
 scrobble_enabled = gvis_config['scrobble']
@@ -145,7 +166,14 @@ class MyWindow(Gtk.Window):
 
 
         # Create a DrawingArea and pack it into the main box
-        self.drawing_area = Gtk.DrawingArea()
+        if render_backend == 'glarea':
+            # draws with the GLArea's own context, no readback into cairo
+            self.drawing_area = Gtk.GLArea()
+            self.drawing_area.set_required_version(3, 3)
+            self.drawing_area.set_has_alpha(True)
+            self.drawing_area.connect("realize", self.on_gl_realize)
+        else:
+            self.drawing_area = Gtk.DrawingArea()
         self.overlay.add(self.drawing_area)
 
 
@@ -232,6 +260,11 @@ class MyWindow(Gtk.Window):
         
         # Connect to MPRIS service and update the album art
         self.source = get_mpris_service()
+        # pw-cat stall/restart counters, filled in by the capture thread
+        self.capture_stats = {}
+        # newest frame from the capture thread, picked up by the visualizer when it draws
+        # (frames that don't change anything don't ask for a redraw, see redraw_threshold)
+        self.frame_mailbox = FrameMailbox(redraw_threshold)
         # Start CAVA processing in a separate thread so it can begin processing audio
         threading.Thread(target=self.run_cava, daemon=True).start()
 
@@ -246,15 +279,13 @@ class MyWindow(Gtk.Window):
             'gradient_points': gradient_points if gradient else None,
             'color': color if not gradient else None,
             'config': gvis_config,  # Pass the full config for shader loading
-            'start_time': start_time
+            'start_time': start_time,
+            'capture_stats': self.capture_stats,
+            'frame_mailbox': self.frame_mailbox
         }
         
-        if vis_type == 'bars':
-            self.visualizer = BarsVisualizer(**visualizer_args)
-        elif vis_type == 'lines':
-            self.visualizer = LinesVisualizer(**visualizer_args)
-        else:
-            raise ValueError(f"Unsupported visualization type: {vis_type}")
+        # only the selected visualizer (and moderngl with it) gets imported
+        self.visualizer = get_visualizer_class(vis_type)(**visualizer_args)
 
         # Print GPU acceleration status
         # this always seems to say that there is no gpu context
@@ -265,13 +296,38 @@ class MyWindow(Gtk.Window):
             if perf_info['current_mode'] == 'GPU':
                 print(f"GPU Context: {perf_info['context_info']}")
         
-        self.drawing_area.connect("draw", self.visualizer.on_draw)
+        if isinstance(self.drawing_area, Gtk.GLArea):
+            self.drawing_area.connect("render", self.on_gl_render)
+        else:
+            self.drawing_area.connect("draw", self.visualizer.on_draw)
         if self.source:
             self.source.connect("g-properties-changed", self.on_properties_changed)
             self.new_song = True
             self.update_info()
             GLib.timeout_add(100, self.update_progress)
     
+    def on_gl_realize(self, area):
+        if area.get_error() is not None:
+            print(f"could not make a GL context for the GLArea: {area.get_error()}")
+            GLib.idle_add(self.use_cairo_backend)
+
+    def on_gl_render(self, area, gl_context):
+        if not self.visualizer.on_render(area, gl_context):
+            GLib.idle_add(self.use_cairo_backend)
+        return True
+
+    def use_cairo_backend(self):
+        # swap the GLArea for a DrawingArea, the visualizer goes back to rendering offscreen and painting with cairo
+        if not isinstance(self.drawing_area, Gtk.GLArea):
+            return False
+        print("falling back to the cairo render backend")
+        self.overlay.remove(self.drawing_area)
+        self.drawing_area = Gtk.DrawingArea()
+        self.drawing_area.connect("draw", self.visualizer.on_draw)
+        self.overlay.add(self.drawing_area)
+        self.drawing_area.show()
+        return False
+
     def get_screen_size(self , display):
         #from user3840170 on stackoverflow
         mon_geoms = [
@@ -359,7 +415,24 @@ class MyWindow(Gtk.Window):
 
     
     def run_cava(self):
-        run_cava(
+        postprocess = None
+        if postprocess_steps:
+            from src.cava.postprocess import PostProcessor
+            postprocess = PostProcessor(
+                number_of_bars, channels, postprocess_steps,
+                smoothing=gvis_config['smoothing'],
+                peak_hold=gvis_config['peak_hold'],
+                peak_falloff=gvis_config['peak_falloff'],
+                monstercat=gvis_config['monstercat'],
+                eq=gvis_config['eq']
+            )
+        if replay_frames_path:
+            # recorded cava frames go straight to the visualizer, no audio or cava at all
+            from src.cava.recording import replay_frames
+            replay_frames(replay_frames_path, self.update_visualization, number_of_bars, channels, replay_speed,
+                          postprocess=postprocess, stats=self.capture_stats)
+            return
+        run_cava_args = dict(
             input_source=input_source,
             buffer_size=buffer_size,
             channels=channels,
@@ -367,14 +440,39 @@ class MyWindow(Gtk.Window):
             cava_lib=cava_lib,
             plan=plan,
             update_visualization=self.update_visualization,
-            source=self.source
+            source=self.source,
+            rate=rate,
+            pacing=input_pacing,
+            stats=self.capture_stats,
+            stall_timeout=stall_timeout,
+            restart_after=stall_restart,
+            adaptive=adaptive_buffer,
+            target_latency=target_latency,
+            gains=input_gains,
+            record_path=record_path,
+            replay_speed=replay_speed,
+            postprocess=postprocess
         )
+        if use_dsp_process:
+            # capture + cava in a child process, this thread just forwards its frames
+            from src.cava.dsp_process import DspProcess
+            DspProcess(spectrum_engine=(base_path, gvis_config['spectrum_engine']),
+                       plan_args=dict(number_of_bars=number_of_bars, rate=rate, channels=channels,
+                                      autosens=autosens, noise_reduction=noise_reduction,
+                                      low_cut_off=low_cut_off, high_cut_off=high_cut_off),
+                       **run_cava_args).run()
+        else:
+            run_cava(**run_cava_args)
+
 
+    def update_visualization(self, sample, stamps=None):
+        # runs on the capture thread, the visualizer takes the frame out of the mailbox when it draws
+        if self.frame_mailbox.post(sample, stamps):
+            GLib.idle_add(self.queue_visualizer_draw)  # only one redraw is ever waiting
 
-    def update_visualization(self, sample):
-        # Update the visualization data and redraw
-        self.visualizer.sample = sample
-        GLib.idle_add(self.drawing_area.queue_draw)  # Request to redraw the area
+    def queue_visualizer_draw(self):
+        self.drawing_area.queue_draw()  # Request to redraw the area
+        return False
 
 
 
@@ -0,0 +1,99 @@
+"""
+gvis - Adaptive capture buffer sizing
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A buffer_size that looks smooth on one machine can be laggy or jittery on another.
+# With adaptive_buffer = True run_cava asks this after every chunk whether the read size should change.
+#
+# latency of a chunk = time to fill it + audio still waiting in the pipe + time spent in cava_execute
+# - audio piling up in the pipe means we can't keep up, so read bigger chunks (fewer cava_execute calls)
+# - over the target means shrink the chunks, unless cava_execute already eats most of the chunk time
+# - well under the target means we can afford bigger (smoother) chunks
+
+
+class AdaptiveBufferSize:
+    """
+    Picks buffer_size at runtime to hit a latency target.
+
+    Args:
+        buffer_size (int): starting size (same units as the config value, bytes per channel).
+        channels (int): number of audio channels.
+        rate (int): sample rate in Hz.
+        target_latency (float): target in milliseconds.
+        window (int): chunks to average over before making a decision.
+    """
+    step = 8  # keeps every chunk a whole number of float32 frames
+    min_size = 64
+    max_size = 16384
+
+    def __init__(self, buffer_size, channels, rate, target_latency=30.0, window=32):
+        self.buffer_size = buffer_size
+        self.channels = channels
+        self.rate = rate
+        self.target = target_latency / 1000
+        self.window = window
+        self.last_latency = None  # seconds, from the last full window
+        self._reset()
+
+    def _reset(self):
+        self.chunks = 0
+        self.backlog_total = 0
+        self.execute_total = 0.0
+
+    def chunk_time(self):
+        """Seconds of audio in one chunk."""
+        return self.buffer_size / 4 / self.rate
+
+    def latency(self):
+        """Estimated latency over the current window in seconds, or None if it isn't full yet."""
+        if self.chunks < self.window:
+            return None
+        backlog = self.backlog_total / self.chunks / (4 * self.channels * self.rate)
+        return self.chunk_time() + backlog + self.execute_total / self.chunks
+
+    def update(self, backlog_bytes, execute_seconds):
+        """
+        Record one chunk. Returns the new buffer_size if it should change, otherwise None.
+        """
+        self.chunks += 1
+        self.backlog_total += backlog_bytes
+        self.execute_total += execute_seconds
+        latency = self.latency()
+        if latency is None:
+            return None
+
+        chunk_time = self.chunk_time()
+        backlog = self.backlog_total / self.chunks / (4 * self.channels * self.rate)
+        execute = self.execute_total / self.chunks
+        self.last_latency = latency
+        self._reset()
+
+        if backlog > chunk_time or execute > chunk_time * 0.5:
+            scale = 1.25  # falling behind
+        elif latency > self.target:
+            scale = 0.8
+        elif latency < self.target * 0.75:
+            scale = 1.1
+        else:
+            return None
+
+        new_size = int(self.buffer_size * scale) // self.step * self.step
+        new_size = min(max(new_size, self.min_size), self.max_size)
+        if new_size == self.buffer_size:
+            return None
+        self.buffer_size = new_size
+        return new_size
@@ -0,0 +1,532 @@
+"""
+gvis - Audio sources
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Everything run_cava reads audio from lives here.
+# A source only has to fill a bytes buffer with interleaved float32 samples
+# (the same thing pw-cat --format f32 gives us) so the capture loop doesn't care where it came from.
+#
+# input_source in the config picks the backend:
+#   file:/path/to/song.wav  -> FileSource (wav or raw f32 pcm)
+#   synth:sweep             -> SyntheticSource (sweep, noise or beat)
+#   replay:/path/to/rec     -> ReplaySource (the pcm from a record_path recording, see recording.py)
+#   anything else           -> PwCatSource with that --target
+# several of them separated by commas (ie. Firefox,mpv) -> MixedSource, all captured at once and mixed
+
+import abc
+import array
+import fcntl
+import os
+import selectors
+import subprocess
+import termios
+import threading
+import time
+import wave
+import numpy as np
+
+
+class AudioSource(abc.ABC):
+    """
+    Base class for audio sources, subclasses have to implement readinto.
+
+    Args:
+        buffer_size (int): bytes per channel to hand out per chunk.
+        channels (int): number of interleaved channels.
+        rate (int): sample rate in Hz.
+        stats (dict): optional dict the source keeps its counters in (shared with the performance info).
+    """
+    name = 'base'
+
+    def __init__(self, buffer_size, channels, rate, stats=None):
+        self.buffer_size = buffer_size
+        self.channels = channels
+        self.rate = rate
+        self.stats = stats if stats is not None else {}
+
+    @abc.abstractmethod
+    def readinto(self, buffer):
+        """
+        Fill buffer (a writable bytes-like object) with float32 samples.
+        Returns the number of bytes written, 0 means the source is finished.
+        """
+
+    def backlog(self):
+        """Bytes of audio that are already waiting to be read (0 if the source can't tell)."""
+        return 0
+
+    def close(self):
+        pass
+
+
+class PwCatSource(AudioSource):
+    """
+    Live PipeWire capture through pw-cat (what gvis always used).
+
+    pw-cat sometimes crashes or just stops sending data when the music is paused,
+    which used to hang the visualizer. Reads are non-blocking with a deadline so a stall
+    gets filled with silence (the bars fall down instead of freezing) and a dead or
+    stuck pw-cat is restarted with an increasing delay between attempts.
+
+    Args:
+        target (str): pw-cat --target value.
+        stall_timeout (float): seconds to wait for a chunk before padding it with silence and counting a stall.
+        restart_after (float): seconds of continuous stall before pw-cat is restarted.
+    """
+    name = 'pw-cat'
+    min_backoff = 0.5
+    max_backoff = 10.0
+
+    def __init__(self, target, buffer_size, channels, rate, stats=None, stall_timeout=0.1, restart_after=5.0):
+        super().__init__(buffer_size, channels, rate, stats)
+        self.target = target
+        self.stall_timeout = stall_timeout
+        self.restart_after = restart_after
+        self.frame_bytes = channels * 4
+        self.stats.setdefault('stalls', 0)
+        self.stats.setdefault('restarts', 0)
+        self.selector = selectors.DefaultSelector()
+        self.process = None
+        self.carry = b''  # partial frame left over from a stalled read
+        self.stalled_since = None
+        self.backoff = self.min_backoff
+        self.next_start = 0.0
+        self.backlog_query = array.array('i', [0])
+        self._start()
+
+    def _start(self):
+        self.next_start = time.monotonic() + self.backoff
+        try:
+            # Open pw-cat to stream audio data from the app or microphone.
+            self.process = subprocess.Popen(
+                ["pw-cat", "-ra", "--target", str(self.target), "--format", "f32", "-"],
+                stdout=subprocess.PIPE,
+                bufsize=0,
+            )
+        except OSError as e:
+            print(f"could not start pw-cat: {e}")
+            self.process = None
+            return
+        os.set_blocking(self.process.stdout.fileno(), False)
+        self.selector.register(self.process.stdout, selectors.EVENT_READ)
+        self.carry = b''
+
+    def _stop(self):
+        if self.process is None:
+            return
+        self.selector.unregister(self.process.stdout)
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process = None
+
+    def _restart(self, reason):
+        now = time.monotonic()
+        if now < self.next_start:
+            return  # still backing off
+        print(f"pw-cat {reason}, restarting (next retry in {self.backoff:.1f}s)")
+        self._stop()
+        self.stats['restarts'] += 1
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        self.stalled_since = None
+        self._start()
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        size = len(view) - len(view) % self.frame_bytes
+        filled = len(self.carry)
+        view[:filled] = self.carry
+        self.carry = b''
+        deadline = time.monotonic() + self.stall_timeout
+
+        while filled < size and self.process is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.selector.select(remaining):
+                break
+            try:
+                read = os.readv(self.process.stdout.fileno(), [view[filled:size]])
+            except BlockingIOError:
+                continue
+            if read == 0:
+                break  # EOF, pw-cat is gone
+            filled += read
+
+        if filled == size:
+            self.stalled_since = None
+            self.backoff = self.min_backoff
+            return size
+
+        # stalled: hand out the whole frames we got and pad the rest with silence
+        aligned = filled - filled % self.frame_bytes
+        self.carry = bytes(view[aligned:filled])
+        view[aligned:size] = bytes(size - aligned)
+
+        # a dead pw-cat returns EOF straight away, wait out the deadline so we dont spin
+        now = time.monotonic()
+        if deadline > now:
+            time.sleep(deadline - now)
+            now = deadline
+
+        if self.stalled_since is None:
+            self.stalled_since = now
+            self.stats['stalls'] += 1
+        if self.process is None or self.process.poll() is not None:
+            self._restart("exited")
+        elif now - self.stalled_since > self.restart_after:
+            self._restart(f"stopped sending audio for {self.restart_after:g}s")
+        return size
+
+    def backlog(self):
+        if self.process is None:
+            return 0
+        try:
+            fcntl.ioctl(self.process.stdout.fileno(), termios.FIONREAD, self.backlog_query)
+        except OSError:
+            return 0
+        return self.backlog_query[0] + len(self.carry)
+
+    def close(self):
+        self._stop()
+        self.selector.close()
+
+
+class _PacedSource(AudioSource):
+    """
+    Shared pacing for sources that can produce audio faster than real time.
+    pacing is either 'realtime' (sleep so chunks arrive like they would from pw-cat)
+    or 'fast' (as fast as possible, for benchmarks).
+    """
+    def __init__(self, buffer_size, channels, rate, pacing='realtime', stats=None):
+        super().__init__(buffer_size, channels, rate, stats)
+        if pacing not in ('realtime', 'fast'):
+            print(f"unknown input_pacing {pacing}, using realtime")
+            pacing = 'realtime'
+        self.pacing = pacing
+        self.frames_sent = 0
+        self.start_time = None
+
+    def _pace(self, frames):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        self.frames_sent += frames
+        if self.pacing == 'realtime':
+            delay = self.start_time + self.frames_sent / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+class FileSource(_PacedSource):
+    """
+    Plays a wav file or a raw pcm file (interleaved float32 at the configured rate and channels).
+    The whole file is decoded into memory once and looped.
+    """
+    name = 'file'
+
+    def __init__(self, path, buffer_size, channels, rate, pacing='realtime', loop=True, stats=None):
+        super().__init__(buffer_size, channels, rate, pacing, stats)
+        self.path = path
+        self.loop = loop
+        self.audio = self._load(path).reshape(-1)
+        self.position = 0
+
+    def _load(self, path):
+        if not path.lower().endswith('.wav'):
+            audio = np.fromfile(path, dtype=np.float32)
+            frames = len(audio) // self.channels
+            return audio[:frames * self.channels].reshape(frames, self.channels)
+
+        with wave.open(path, 'rb') as wav:
+            file_channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            file_rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+
+        if file_rate != self.rate:
+            print(f"{path} is {file_rate}Hz but rate is set to {self.rate}Hz, it will play at the wrong speed")
+
+        if width == 1:
+            audio = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            audio = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+        elif width == 3:
+            # 24 bit has no numpy dtype so pad it out to 32 bit
+            packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+            padded = np.zeros((len(packed), 4), dtype=np.uint8)
+            padded[:, 1:] = packed
+            audio = padded.view('<i4').reshape(-1).astype(np.float32) / 2147483648
+        elif width == 4:
+            audio = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+        else:
+            raise ValueError(f"unsupported wav sample width: {width}")
+
+        audio = audio.reshape(-1, file_channels)
+        if file_channels >= self.channels:
+            return np.ascontiguousarray(audio[:, :self.channels])
+        # not enough channels (ie. mono), repeat the last one
+        return np.concatenate(
+            [audio] + [audio[:, -1:]] * (self.channels - file_channels), axis=1
+        )
+
+    def readinto(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        wanted = len(out) - len(out) % self.channels
+        written = 0
+        while written < wanted:
+            if self.position >= len(self.audio):
+                if not self.loop or len(self.audio) == 0:
+                    break
+                self.position = 0
+            count = min(wanted - written, len(self.audio) - self.position)
+            out[written:written + count] = self.audio[self.position:self.position + count]
+            written += count
+            self.position += count
+        self._pace(written // self.channels)
+        return written * 4
+
+
+class SyntheticSource(_PacedSource):
+    """
+    Generates test signals so the pipeline can run without any audio hardware.
+
+    kinds:
+        sweep - log sine sweep from 40Hz to 12kHz every 10 seconds
+        noise - white noise
+        beat  - 120bpm kick drum with a hihat on the off beat
+    """
+    name = 'synth'
+    kinds = ('sweep', 'noise', 'beat')
+
+    def __init__(self, kind, buffer_size, channels, rate, pacing='realtime', stats=None):
+        super().__init__(buffer_size, channels, rate, pacing, stats)
+        if kind not in self.kinds:
+            print(f"unknown synth signal {kind}, using sweep")
+            kind = 'sweep'
+        self.kind = kind
+        self.rng = np.random.default_rng(0)
+        self.phase = 0.0
+
+        frames = (buffer_size * channels // 4) // channels
+        self.mono = np.zeros(frames, dtype=np.float64)
+        self.times = np.zeros(frames, dtype=np.float64)
+        self.scratch = np.zeros(frames, dtype=np.float64)
+
+    def _generate(self, frames):
+        t = self.times[:frames]
+        np.add(np.arange(frames), self.frames_sent, out=t)
+        t /= self.rate
+        out = self.mono[:frames]
+        scratch = self.scratch[:frames]
+
+        if self.kind == 'sweep':
+            # instantaneous frequency, then integrate it so the phase stays continuous between chunks
+            np.mod(t, 10.0, out=scratch)
+            scratch *= np.log(12000 / 40) / 10.0
+            np.exp(scratch, out=scratch)
+            scratch *= 40 * 2 * np.pi / self.rate
+            np.cumsum(scratch, out=out)
+            out += self.phase
+            self.phase = float(out[-1]) % (2 * np.pi)
+            np.sin(out, out=out)
+            out *= 0.5
+        elif self.kind == 'noise':
+            self.rng.standard_normal(out=out)
+            out *= 0.2
+        else:
+            beat = 0.5  # seconds per beat at 120bpm
+            np.mod(t, beat, out=scratch)
+            # kick: 60Hz sine with a fast decay at the start of every beat
+            np.sin(2 * np.pi * 60 * scratch, out=out)
+            out *= np.exp(-scratch * 12)
+            # hihat: short burst of noise on the off beat
+            np.mod(t + beat / 2, beat, out=scratch)
+            np.exp(-scratch * 80, out=scratch)
+            scratch *= self.rng.standard_normal(frames) * 0.3
+            out += scratch
+        return out
+
+    def readinto(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        frames = len(out) // self.channels
+        if frames > len(self.mono):
+            # the chunk size grew (adaptive_buffer)
+            self.mono = np.zeros(frames, dtype=np.float64)
+            self.times = np.zeros(frames, dtype=np.float64)
+            self.scratch = np.zeros(frames, dtype=np.float64)
+        mono = self._generate(frames)
+        out[:frames * self.channels].reshape(frames, self.channels)[:] = mono[:, None]
+        self._pace(frames)
+        return frames * self.channels * 4
+
+
+class _SourceReader:
+    """
+    One source of a MixedSource plus the thread that keeps reading from it.
+    Only the newest chunk is kept (the mixer wants low latency, not a backlog), a chunk the mixer
+    didn't get to before the next one came in is counted in dropped_chunks.
+    """
+
+    def __init__(self, name, source, gain, chunk_bytes):
+        self.name = name
+        self.source = source
+        self.gain = gain
+        self.stats = source.stats
+        self.stats.setdefault('chunks', 0)
+        self.stats.setdefault('underruns', 0)
+        self.stats.setdefault('dropped_chunks', 0)
+        self.stats.setdefault('read_ms', 0.0)
+        self.chunk_bytes = chunk_bytes
+        self.staging = np.zeros(chunk_bytes // 4, dtype=np.float32)
+        self.ready = np.zeros(chunk_bytes // 4, dtype=np.float32)
+        self.ready_bytes = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f'gvis-capture-{name}', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            chunk_bytes = self.chunk_bytes
+            if len(self.staging) * 4 != chunk_bytes:
+                self.staging = np.zeros(chunk_bytes // 4, dtype=np.float32)
+            start = time.perf_counter()
+            read = self.source.readinto(memoryview(self.staging).cast('B'))
+            read_time = time.perf_counter() - start
+            if not read:
+                break
+            with self.condition:
+                if len(self.ready) != len(self.staging):
+                    self.ready = np.zeros_like(self.staging)
+                if self.ready_bytes:
+                    # the mixer hasn't taken the last one, it gets replaced by this one
+                    self.stats['dropped_chunks'] += 1
+                # swap instead of copy, the mixer only touches ready under the lock
+                self.staging, self.ready = self.ready, self.staging
+                self.ready_bytes = read
+                self.stats['chunks'] += 1
+                # rolling average so it doesn't need any history
+                self.stats['read_ms'] += (read_time * 1000 - self.stats['read_ms']) / 32
+                self.condition.notify()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def take_into(self, row, timeout):
+        """Copy the newest chunk into row. Returns False (and leaves row silent) if none came in time."""
+        with self.condition:
+            if not self.ready_bytes and self.running:
+                self.condition.wait(timeout)
+            if not self.ready_bytes:
+                self.stats['underruns'] += 1
+                row.fill(0)
+                return False
+            samples = min(self.ready_bytes // 4, len(row))
+            row[:samples] = self.ready[:samples]
+            row[samples:] = 0
+            self.ready_bytes = 0
+            return True
+
+    def close(self):
+        self.running = False
+        self.source.close()
+
+
+class MixedSource(AudioSource):
+    """
+    Captures several sources at once (one reader thread each) and mixes them into one stream.
+
+    Args:
+        sources (list of (name, AudioSource)): the sources to mix.
+        gains (list of float): volume for each source, missing ones default to 1.0.
+        timeout (float): how long to wait for a source before mixing it in as silence.
+    """
+    name = 'mixed'
+
+    def __init__(self, sources, gains, buffer_size, channels, rate, stats=None, timeout=0.1):
+        super().__init__(buffer_size, channels, rate, stats)
+        self.timeout = timeout
+        chunk_bytes = buffer_size * channels
+        gains = list(gains or [])
+        gains += [1.0] * (len(sources) - len(gains))
+        self.stats['sources'] = {name: source.stats for name, source in sources}
+        self.readers = [
+            _SourceReader(name, source, gain, chunk_bytes)
+            for (name, source), gain in zip(sources, gains)
+        ]
+        self.gains = np.array(gains[:len(sources)], dtype=np.float32)
+        self.stack = np.zeros((len(sources), chunk_bytes // 4), dtype=np.float32)
+
+    def readinto(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        if self.stack.shape[1] != len(out):
+            # the chunk size changed (adaptive_buffer), the readers pick it up from their next read
+            self.stack = np.zeros((len(self.readers), len(out)), dtype=np.float32)
+            for reader in self.readers:
+                reader.chunk_bytes = len(out) * 4
+
+        deadline = time.monotonic() + self.timeout
+        got_any = False
+        for reader, row in zip(self.readers, self.stack):
+            got_any |= reader.take_into(row, max(deadline - time.monotonic(), 0))
+        if not got_any and not any(reader.running for reader in self.readers):
+            return 0
+
+        # mix every source with its gain in one go
+        np.matmul(self.gains, self.stack, out=out)
+        return len(out) * 4
+
+    def backlog(self):
+        return max(reader.source.backlog() for reader in self.readers)
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def open_audio_source(input_source, buffer_size, channels, rate, pacing='realtime', stats=None,
+                      stall_timeout=0.1, restart_after=5.0, gains=None, replay_speed=1.0):
+    """
+    Create the audio source described by input_source.
+    input_source should already be resolved (ie. not 'Auto').
+    stall_timeout and restart_after only matter for pw-cat, gains only for several sources
+    and replay_speed only for replay: sources.
+    """
+    if ',' in input_source:
+        names = [name.strip() for name in input_source.split(',') if name.strip()]
+        print(f"mixing {len(names)} sources: {names}")
+        sources = [
+            (name, open_audio_source(name, buffer_size, channels, rate, pacing, {}, stall_timeout, restart_after,
+                                     replay_speed=replay_speed))
+            for name in names
+        ]
+        # pw-cat already pads stalls with silence, wait a bit longer than it does before giving up on a source
+        return MixedSource(sources, gains, buffer_size, channels, rate, stats, timeout=stall_timeout * 2)
+    if input_source.startswith('file:'):
+        path = input_source[len('file:'):]
+        print(f"reading audio from file {path}")
+        return FileSource(path, buffer_size, channels, rate, pacing, stats=stats)
+    if input_source.startswith('synth:'):
+        kind = input_source[len('synth:'):]
+        print(f"using synthetic {kind} signal")
+        return SyntheticSource(kind, buffer_size, channels, rate, pacing, stats=stats)
+    if input_source.startswith('replay:'):
+        # imported here, recording.py imports this module
+        from src.cava.recording import ReplaySource
+        path = input_source[len('replay:'):]
+        print(f"replaying recorded audio from {path} at {replay_speed}x")
+        return ReplaySource(path, buffer_size, channels, rate, replay_speed, stats=stats)
+    return PwCatSource(input_source, buffer_size, channels, rate, stats, stall_timeout, restart_after)
@@ -0,0 +1,117 @@
+"""
+gvis - Headless capture/DSP benchmark
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Runs the audio pipeline without gtk or pipewire so it can be timed anywhere.
+# usage (from the project root):
+#   python3 -m src.cava.benchmark --source synth:sweep --seconds 5
+#   python3 -m src.cava.benchmark --source file:/path/to/song.wav --pacing realtime
+#   python3 -m src.cava.benchmark --engine both   (libcavacore vs the numpy engine on the same input)
+
+import argparse
+import os
+import threading
+import time
+
+import src.cava.cava_init as cava_init
+from src.cava.cava_init import initialize_plan
+from src.cava.audio_sources import open_audio_source
+from src.cava.run_cava import CaptureBuffers, run_cava
+
+
+def bench_execute(cava_lib, plan, source, buffer_size, channels, number_of_bars, iterations):
+    """Time cava_execute on its own, the audio is read before the clock starts."""
+    buffers = CaptureBuffers(buffer_size, channels, number_of_bars)
+    samples = buffers.fill(source)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        buffers.execute(cava_lib, plan, samples)
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed, elapsed / iterations * 1000
+
+
+def bench_pipeline(cava_lib, plan, args):
+    """Run the real run_cava loop for a while and count the frames it hands out."""
+    frames = 0
+    stop = threading.Event()
+
+    def count_frame(sample, stamps):
+        nonlocal frames
+        frames += 1
+
+    thread = threading.Thread(target=run_cava, kwargs=dict(
+        input_source=args.source,
+        buffer_size=args.buffer_size,
+        channels=args.channels,
+        number_of_bars=args.bars,
+        cava_lib=cava_lib,
+        plan=plan,
+        update_visualization=count_frame,
+        source=None,
+        rate=args.rate,
+        pacing=args.pacing,
+        replay_speed=0 if args.pacing == 'fast' else 1.0,
+        stop_event=stop,
+    ), daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    thread.join()
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the gvis audio pipeline without a display")
+    parser.add_argument('--source', default='synth:sweep', help="file:PATH, replay:PATH or synth:sweep|noise|beat")
+    parser.add_argument('--pacing', default='fast', choices=('fast', 'realtime'))
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--bars', type=int, default=50)
+    parser.add_argument('--rate', type=int, default=44100)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--buffer-size', type=int, default=1200)
+    parser.add_argument('--engine', default='cavacore', choices=('cavacore', 'numpy', 'both'))
+    args = parser.parse_args()
+
+    if args.source == 'Auto':
+        parser.error("Auto needs MPRIS, use a file: or synth: source")
+
+    base_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    engines = ('cavacore', 'numpy') if args.engine == 'both' else (args.engine,)
+
+    for engine in engines:
+        cava_lib = cava_init.load_spectrum_engine(base_path, engine)
+        plan = initialize_plan(cava_lib, args.bars, args.rate, args.channels, 1, 0.77, 50, 10000)
+
+        # a fresh source for every engine so they all see exactly the same audio
+        source = open_audio_source(args.source, args.buffer_size, args.channels, args.rate, 'fast', replay_speed=0)
+        try:
+            calls, ms = bench_execute(cava_lib, plan, source, args.buffer_size, args.channels, args.bars, args.iterations)
+        finally:
+            source.close()
+        print(f"[{engine}] cava_execute: {calls:.0f} calls/s ({ms:.4f} ms per call)")
+
+        fps = bench_pipeline(cava_lib, plan, args)
+        print(f"[{engine}] run_cava ({args.pacing}): {fps:.1f} frames/s")
+
+        cava_lib.cava_destroy(plan)
+
+
+if __name__ == '__main__':
+    main()
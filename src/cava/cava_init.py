@@ -71,12 +71,46 @@ def initialize_cava(base_path):
 
     cava_lib.cava_destroy.argtypes = [ctypes.POINTER(ctypes.c_void_p)]
 
+def load_spectrum_engine(base_path, engine='auto'):
+    """
+    Load the library that turns audio into bars.
+
+    Args:
+        base_path (str): The base directory path where the `libcavacore.so` 
+                         shared library is located.
+        engine (str): 'cavacore', 'numpy' or 'auto' (cavacore, falling back to numpy
+                      if there is no libcavacore for this machine).
+
+    Returns:
+        An object with cava_init, cava_execute and cava_destroy (the ctypes library or NumpyCava).
+
+    Raises:
+        OSError: If engine is 'cavacore' and the shared library cannot be loaded.
+    """
+    if engine not in ('auto', 'cavacore', 'numpy'):
+        print(f"unknown spectrum_engine {engine}, using auto")
+        engine = 'auto'
+
+    if engine != 'numpy':
+        try:
+            initialize_cava(base_path)
+            print("Using libcavacore spectrum engine")
+            return cava_lib
+        except OSError as e:
+            if engine == 'cavacore':
+                raise
+            print(f"{e}. falling back to the numpy spectrum engine")
+
+    from src.cava.numpy_cava import NumpyCava
+    print("Using numpy spectrum engine")
+    return NumpyCava()
+
 def initialize_plan(cava_lib, number_of_bars, rate, channels, autosens, noise_reduction, low_cut_off, high_cut_off):
     """
     Initializes the CAVA plan using the provided configuration parameters.
 
     Args:
-        cava_lib: The loaded CAVA library object.
+        cava_lib: The loaded CAVA library object (or NumpyCava).
         number_of_bars (int): Number of bars for visualization.
         rate (int): Audio sample rate.
         channels (int): Number of audio channels.
@@ -0,0 +1,207 @@
+"""
+gvis - Capture and DSP in a child process
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# With dsp_process = True run_cava runs in its own process so album art, dbus and cairo
+# can't hold the GIL while audio is waiting to be read.
+# Frames come back through a shared memory ring. The header holds a sequence counter that is
+# only bumped after a frame is fully written, the UI process maps the same memory and reads
+# the newest slot in place.
+#
+# The child is spawned, not forked: forking a process with gtk, dbus and a handful of threads in it can
+# deadlock the child on a lock some other thread held at the time. It starts from _child_main with
+# nothing but plain arguments, loads the spectrum engine and makes its own cava plan, and opens the
+# ring by its name. gvis.py isn't run again in it (see DspProcess.run).
+
+import atexit
+import multiprocessing
+import queue
+import sys
+import time
+import types
+from multiprocessing import shared_memory
+import numpy as np
+from src.cava.run_cava import run_cava, resolve_input_source
+from src.latency import STAMPS
+
+HEADER_FIELDS = 2  # sequence, number of slots
+
+
+class SpectrumRing:
+    """
+    Ring of spectrum frames in shared memory.
+
+    Args:
+        frame_len (int): values per frame (number_of_bars * channels).
+        slots (int): how many frames the ring holds, the reader has slots - 1 frames
+                     of slack before the one it is reading gets overwritten.
+        name (str): name of a ring another process made, None to make a new one.
+    """
+    def __init__(self, frame_len, slots=4, name=None):
+        self.frame_len = frame_len
+        self.slots = slots
+        self.owner = name is None
+        size = HEADER_FIELDS * 8 + slots * (frame_len + STAMPS) * 8
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        # each slot is the frame followed by its latency stamps
+        slots_view = np.ndarray((slots, frame_len + STAMPS), dtype=np.float64, buffer=self.shm.buf, offset=HEADER_FIELDS * 8)
+        self.frames = slots_view[:, :frame_len]
+        self.stamps = slots_view[:, frame_len:]
+        if self.owner:
+            self.header[0] = 0
+            self.header[1] = slots
+
+    def publish(self, frame, stamps):
+        """Writer side: copy frame into the next slot, then make it visible."""
+        sequence = int(self.header[0]) + 1
+        np.copyto(self.frames[sequence % self.slots], frame)
+        np.copyto(self.stamps[sequence % self.slots], stamps)
+        self.header[0] = sequence
+
+    def latest(self):
+        """
+        Reader side: (sequence, frame, stamps) for the newest slot.
+        The arrays are views straight into shared memory.
+        """
+        sequence = int(self.header[0])
+        slot = sequence % self.slots
+        return sequence, self.frames[slot], self.stamps[slot]
+
+    def is_intact(self, sequence):
+        """True if the slot for sequence can't have been overwritten while it was being read."""
+        return int(self.header[0]) - sequence < self.slots - 1
+
+    def close(self):
+        # the numpy views have to go before the mapping can be closed
+        del self.header, self.frames, self.stamps
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _child_main(ring_name, frame_len, slots, frame_ready, stats_queue, stats_interval, spectrum_engine, plan_args,
+                run_cava_args):
+    """Entry point of the dsp process. Everything it gets is plain data (or a multiprocessing primitive)."""
+    from src.cava.cava_init import load_spectrum_engine, initialize_plan
+    cava_lib = load_spectrum_engine(*spectrum_engine)
+    plan = initialize_plan(cava_lib, **plan_args)
+    ring = SpectrumRing(frame_len, slots, name=ring_name)
+    stats = {}
+    last_sent = time.monotonic()
+
+    def publish(frame, stamps):
+        nonlocal last_sent
+        ring.publish(frame, stamps)
+        frame_ready.set()
+        now = time.monotonic()
+        if now - last_sent > stats_interval:
+            stats_queue.put(dict(stats))
+            last_sent = now
+
+    try:
+        run_cava(cava_lib=cava_lib, plan=plan, update_visualization=publish, source=None, stats=stats, **run_cava_args)
+    finally:
+        ring.close()
+
+
+class DspProcess:
+    """
+    Runs run_cava in a spawned child and hands its frames to update_visualization in this process.
+
+    Takes the same arguments as run_cava, except that the child loads the spectrum engine and makes
+    its own plan: cava_lib and plan are ignored and spectrum_engine ((base_path, engine) for
+    load_spectrum_engine) and plan_args (the initialize_plan arguments) are used instead.
+    input_source is resolved here (MPRIS lives in this process) before the child starts.
+    """
+    stats_interval = 1.0  # how often the child sends its capture counters back
+
+    def __init__(self, update_visualization, spectrum_engine, plan_args, stats=None, **run_cava_args):
+        self.update_visualization = update_visualization
+        self.stats = stats if stats is not None else {}
+        run_cava_args['input_source'] = resolve_input_source(run_cava_args['input_source'], run_cava_args['source'])
+        # ctypes handles and dbus proxies can't go to another process
+        for name in ('source', 'cava_lib', 'plan'):
+            run_cava_args.pop(name, None)
+
+        frame_len = run_cava_args['number_of_bars'] * run_cava_args['channels']
+        self.ring = SpectrumRing(frame_len)
+        # the newest frame gets copied here and checked before it goes anywhere
+        self.frame = np.zeros(frame_len, dtype=np.float64)
+        self.frame_stamps = np.zeros(STAMPS, dtype=np.float64)
+        context = multiprocessing.get_context('spawn')
+        self.frame_ready = context.Event()
+        self.stats_queue = context.Queue()
+        self.process = context.Process(
+            target=_child_main, name='gvis-dsp', daemon=True,
+            args=(self.ring.name, frame_len, self.ring.slots, self.frame_ready, self.stats_queue,
+                  self.stats_interval, spectrum_engine, plan_args, run_cava_args))
+
+    def run(self):
+        """Start the child and forward its frames until it exits. Blocks, so call it from a thread."""
+        # spawn normally runs the parent's __main__ (gvis.py) again in the child, which would load the
+        # config, log in to last.fm and open a second window. The child only needs _child_main,
+        # so it is started while __main__ is an empty module
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            self.process.start()
+        finally:
+            sys.modules['__main__'] = main
+        atexit.register(self.stop)
+        last_sequence = 0
+        try:
+            while self.process.is_alive():
+                if not self.frame_ready.wait(0.5):
+                    continue
+                self.frame_ready.clear()
+                sequence = self._read_latest()
+                if sequence == last_sequence:
+                    continue
+                self.update_visualization(self.frame, self.frame_stamps)
+                last_sequence = sequence
+                self._collect_stats()
+        finally:
+            self.stop()
+
+    def _read_latest(self):
+        """Copy the newest frame out of the ring, again if the child wrote over it while it was being copied."""
+        while True:
+            sequence, frame, stamps = self.ring.latest()
+            np.copyto(self.frame, frame)
+            np.copyto(self.frame_stamps, stamps)
+            if self.ring.is_intact(sequence):
+                return sequence
+
+    def _collect_stats(self):
+        while True:
+            try:
+                self.stats.update(self.stats_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def stop(self):
+        if self.process.pid is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
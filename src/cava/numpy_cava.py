@@ -0,0 +1,166 @@
+"""
+gvis - Pure NumPy spectrum engine
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A stand in for libcavacore for machines we don't have a prebuilt .so for.
+# It follows the same steps as cavacore (three windowed ffts for bass/mid/treble,
+# log spaced bars, gravity, integral smoothing and autosens) but it is not bit for bit the same.
+# NumpyCava has the same cava_init/cava_execute/cava_destroy functions as the ctypes library
+# so run_cava and initialize_plan don't need to know which one they have.
+
+import numpy as np
+
+BASS_CUT_OFF = 100
+TREBLE_CUT_OFF = 500
+
+
+class NumpyCavaPlan:
+    """Everything cava_init works out up front plus the state cava_execute carries between calls."""
+
+    def __init__(self, number_of_bars, rate, channels, autosens, noise_reduction, low_cut_off, high_cut_off):
+        self.number_of_bars = number_of_bars
+        self.rate = rate
+        self.channels = channels
+        self.autosens = bool(autosens)
+        self.noise_reduction = noise_reduction
+
+        # same fft sizes as cavacore, they grow with the sample rate
+        treble_size = 128
+        if rate > 8125:
+            treble_size *= 2
+        if rate > 16250:
+            treble_size *= 2
+        if rate > 32500:
+            treble_size *= 2
+        if rate > 75000:
+            treble_size *= 2
+        if rate > 150000:
+            treble_size *= 2
+        self.fft_sizes = (treble_size * 4, treble_size * 2, treble_size)  # bass, mid, treble
+        self.windows = [np.hanning(size) for size in self.fft_sizes]
+        self.history = np.zeros((channels, self.fft_sizes[0]), dtype=np.float64)
+
+        self.mappings = self._build_mappings(number_of_bars, rate, low_cut_off, high_cut_off)
+
+        shape = (channels, number_of_bars)
+        self.bars = np.zeros(shape)
+        self.mem = np.zeros(shape)
+        self.peak = np.zeros(shape)
+        self.fall = np.zeros(shape)
+        self.prev = np.zeros(shape)
+        self.falling = np.zeros(shape, dtype=bool)
+        self.sens = 1.0
+        self.sens_init = True
+        self.framerate = 75.0
+
+    def _build_mappings(self, number_of_bars, rate, low_cut_off, high_cut_off):
+        """
+        Make one (bars x fft bins) matrix per fft size.
+        Each row averages the bins that belong to that bar and applies the eq,
+        so a whole fft turns into bar values with a single matrix multiply.
+        """
+        edges = np.geomspace(low_cut_off, high_cut_off, number_of_bars + 1)
+        centres = np.sqrt(edges[:-1] * edges[1:])
+        # cavacore weights bars by frequency to make up for music having less energy up high
+        eq = centres / np.sqrt(low_cut_off * high_cut_off)
+
+        mappings = [np.zeros((number_of_bars, size // 2 + 1)) for size in self.fft_sizes]
+        previous = [-1, -1, -1]
+        for bar in range(number_of_bars):
+            if edges[bar] < BASS_CUT_OFF:
+                fft = 0
+            elif edges[bar] < TREBLE_CUT_OFF:
+                fft = 1
+            else:
+                fft = 2
+            size = self.fft_sizes[fft]
+            bin_width = rate / size
+            last_bin = size // 2
+            lower = int(round(edges[bar] / bin_width))
+            upper = int(round(edges[bar + 1] / bin_width)) - 1
+            # like cavacore, every bar gets at least one bin of its own
+            lower = min(max(lower, previous[fft] + 1), last_bin)
+            upper = min(max(upper, lower), last_bin)
+            previous[fft] = upper
+            # 4 / size brings a full scale sine (after the hann window) to about 1
+            mappings[fft][bar, lower:upper + 1] = eq[bar] * 4 / size / (upper - lower + 1)
+        # transposed so it is (channels x bins) @ (bins x bars)
+        return [np.ascontiguousarray(m.T) for m in mappings]
+
+    def execute(self, samples, output):
+        frames = len(samples) // self.channels
+        if frames:
+            new = samples[:frames * self.channels].reshape(frames, self.channels).T
+            history = self.history
+            if frames >= history.shape[1]:
+                history[:] = new[:, -history.shape[1]:]
+            else:
+                history[:, :-frames] = history[:, frames:]
+                history[:, -frames:] = new
+            self.framerate += (self.rate / frames - self.framerate) / 64
+
+        silence = not np.any(samples)
+
+        bars = self.bars
+        bars.fill(0)
+        for size, window, mapping in zip(self.fft_sizes, self.windows, self.mappings):
+            spectrum = np.abs(np.fft.rfft(self.history[:, -size:] * window, axis=1))
+            bars += spectrum @ mapping
+        bars *= self.sens
+
+        if self.noise_reduction > 0.1:
+            # gravity: falling bars drop along a curve instead of jumping down
+            gravity_mod = max(pow(60 / self.framerate, 2.5) * 1.54 / self.noise_reduction, 1)
+            falling = np.less(bars, self.prev, out=self.falling)
+            fallen = self.peak * (1 - self.fall * self.fall * gravity_mod)
+            np.copyto(bars, np.maximum(fallen, 0), where=falling)
+            self.fall += 0.028
+            np.copyto(self.peak, bars, where=~falling)
+            self.fall[~falling] = 0
+        self.prev[:] = bars
+
+        # integral smoothing
+        bars += self.mem * self.noise_reduction
+        self.mem[:] = bars
+
+        if self.autosens:
+            if np.any(bars > 1):
+                self.sens *= 0.98
+                self.sens_init = False
+            elif not silence:
+                self.sens *= 1.001
+                if self.sens_init:
+                    self.sens *= 1.1
+
+        output[:bars.size] = bars.reshape(-1)
+
+
+class NumpyCava:
+    """Drop in replacement for the libcavacore ctypes library."""
+    name = 'numpy'
+
+    def cava_init(self, number_of_bars, rate, channels, autosens, noise_reduction, low_cut_off, high_cut_off):
+        return NumpyCavaPlan(number_of_bars, rate, channels, autosens, noise_reduction, low_cut_off, high_cut_off)
+
+    def cava_execute(self, cava_in, new_samples, cava_out, plan):
+        # run_cava passes ctypes pointers to its own buffers, these are views so nothing is copied
+        samples = np.ctypeslib.as_array(cava_in, shape=(new_samples,))
+        output = np.ctypeslib.as_array(cava_out, shape=(plan.number_of_bars * plan.channels,))
+        plan.execute(samples, output)
+
+    def cava_destroy(self, plan):
+        pass
@@ -0,0 +1,135 @@
+"""
+gvis - Spectrum post processing between cava and the visualizer
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# postprocess in the config lists the steps to run on every frame, in order:
+#   eq         -> multiply each bar by a gain (the eq values are spread out over the bars)
+#   monstercat -> every bar pulls its neighbours up, falling off by the monstercat factor per bar
+#                 (done in logs as two running maxes, one from each side, so it stays O(bars))
+#   smoothing  -> exponential smoothing against the last frame
+#   peaks      -> bars jump up straight away, stay there for peak_hold frames and then fall
+#
+# This runs on the capture thread (or in the dsp process) right after cava_execute.
+# Every array is allocated once when the processor is made, the steps only write into them with out=.
+# The frame is viewed as (channels, bars) since cava puts all the left bars first and then all the right ones.
+
+import time
+import numpy as np
+
+KERNELS = ('eq', 'monstercat', 'smoothing', 'peaks')
+
+
+class PostProcessor:
+    """
+    Args:
+        number_of_bars (int): bars per channel.
+        channels (int): number of audio channels.
+        steps (list): names from KERNELS, run in the given order.
+        smoothing (float): 0 is off, closer to 1 is smoother.
+        peak_hold (int): frames a peak stays up before it starts falling.
+        peak_falloff (float): how far a peak falls every frame after that.
+        monstercat (float): how quickly the neighbour spreading dies off, has to be above 1.
+        eq (list): gains spread across the bars from lowest to highest, empty for none.
+    """
+    stats_every = 64  # frames between updates of the timings in stats
+
+    def __init__(self, number_of_bars, channels, steps, smoothing=0.5, peak_hold=10, peak_falloff=0.02,
+                 monstercat=1.5, eq=None):
+        # load_config already dropped unknown names, this is for anyone making one by hand
+        for name in steps:
+            if name not in KERNELS:
+                raise ValueError(f"unknown postprocess step {name}, expected one of {', '.join(KERNELS)}")
+        self.steps = [(name, getattr(self, '_' + name)) for name in steps]
+        shape = (channels, number_of_bars)
+        self.output = np.zeros(channels * number_of_bars, dtype=np.float64)
+        self.frame = self.output.reshape(shape)
+        self.scratch = np.zeros(shape, dtype=np.float64)
+        self.times = np.zeros(len(self.steps), dtype=np.float64)
+        self.frames = 0
+
+        # eq: gain per bar
+        self.eq = np.ones(number_of_bars, dtype=np.float64)
+        if eq:
+            self.eq[:] = np.interp(np.linspace(0, 1, number_of_bars), np.linspace(0, 1, len(eq)), eq)
+
+        # monstercat: bar i = max over j of bar j * monstercat ** -|i - j|
+        if 'monstercat' in steps:
+            # log(bar j) + j * log(m) for the pass from the left, log(bar j) - j * log(m) from the right
+            self.ramp = np.arange(number_of_bars, dtype=np.float64) * np.log(float(max(monstercat, 1.0001)))
+            self.log_frame = np.zeros(shape, dtype=np.float64)
+            self.from_left = np.zeros(shape, dtype=np.float64)
+            self.from_right = np.zeros(shape, dtype=np.float64)
+
+        # smoothing
+        self.smoothing = min(max(smoothing, 0.0), 0.99)
+        self.previous = np.zeros(shape, dtype=np.float64)
+
+        # peaks
+        self.peak_hold = peak_hold
+        self.peak_falloff = peak_falloff
+        self.peaks = np.zeros(shape, dtype=np.float64)
+        self.peak_age = np.zeros(shape, dtype=np.int64)
+        self.peak_new = np.zeros(shape, dtype=bool)
+        self.peak_falling = np.zeros(shape, dtype=bool)
+
+    def _eq(self, frame):
+        np.multiply(frame, self.eq, out=frame)
+
+    def _monstercat(self, frame):
+        with np.errstate(divide='ignore'):
+            np.log(frame, out=self.log_frame)  # silent bars are -inf, which is fine for a max
+        # from the left: max over j <= i of log(bar j) + (j - i) * log(m)
+        np.add(self.log_frame, self.ramp, out=self.from_left)
+        np.maximum.accumulate(self.from_left, axis=1, out=self.from_left)
+        np.subtract(self.from_left, self.ramp, out=self.from_left)
+        # from the right: max over j >= i of log(bar j) - (j - i) * log(m)
+        np.subtract(self.log_frame, self.ramp, out=self.from_right)
+        np.maximum.accumulate(self.from_right[:, ::-1], axis=1, out=self.from_right[:, ::-1])
+        np.add(self.from_right, self.ramp, out=self.from_right)
+        np.maximum(self.from_left, self.from_right, out=self.from_left)
+        np.exp(self.from_left, out=frame)
+
+    def _smoothing(self, frame):
+        np.multiply(self.previous, self.smoothing, out=self.previous)
+        np.multiply(frame, 1 - self.smoothing, out=self.scratch)
+        np.add(self.previous, self.scratch, out=self.previous)
+        np.copyto(frame, self.previous)
+
+    def _peaks(self, frame):
+        np.greater_equal(frame, self.peaks, out=self.peak_new)
+        np.maximum(frame, self.peaks, out=self.peaks)
+        self.peak_age += 1
+        np.copyto(self.peak_age, 0, where=self.peak_new)
+        np.greater(self.peak_age, self.peak_hold, out=self.peak_falling)
+        np.subtract(self.peaks, self.peak_falloff, out=self.peaks, where=self.peak_falling)
+        np.maximum(self.peaks, 0, out=self.peaks)
+        np.copyto(frame, self.peaks)
+
+    def process(self, cava_output, stats=None):
+        """Run the steps on a copy of cava_output and return it. The returned array is reused next frame."""
+        np.copyto(self.output, cava_output)
+        for i, (_, kernel) in enumerate(self.steps):
+            start = time.perf_counter()
+            kernel(self.frame)
+            # rolling average so one slow frame doesn't swamp the number
+            self.times[i] += (time.perf_counter() - start - self.times[i]) * 0.05
+        self.frames += 1
+        if stats is not None and self.frames % self.stats_every == 0:
+            stats['postprocess_ms'] = {
+                name: round(float(self.times[i]) * 1000, 4) for i, (name, _) in enumerate(self.steps)
+            }
+        return self.output
@@ -0,0 +1,132 @@
+"""
+gvis - PipeWire node lookup for input_source = Auto
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Auto used to map the MPRIS Identity to a node name with hard coded ifs for firefox and one vlc version.
+# Now we take a pw-dump snapshot, index every audio output stream by application name,
+# binary and process id, and look the player up in that.
+# A lookup only happens when MPRIS hands us a player, which is exactly when the graph may have changed
+# (a new player, or the old one restarted with new nodes), so every lookup takes a new snapshot unless
+# the last one is less than min_refresh seconds old. That's cheaper than following pw-dump --monitor
+# the whole time for something that is asked a handful of times per session.
+#
+# PipeWireNodeIndex(dump) works on an already parsed pw-dump so it can be fed a recorded json file.
+
+import json
+import re
+import subprocess
+import time
+
+STREAM_CLASSES = ('Stream/Output/Audio',)
+
+
+class PipeWireNodeIndex:
+    """
+    Index of PipeWire audio streams.
+
+    Args:
+        dump (list): parsed pw-dump output (a list of pipewire objects).
+    """
+    def __init__(self, dump=None):
+        self.by_pid = {}
+        self.by_binary = {}
+        self.by_name = {}
+        self.targets = []
+        if dump:
+            self._index(dump)
+
+    @classmethod
+    def from_file(cls, path):
+        """Build an index from a saved pw-dump json file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _index(self, dump):
+        for obj in dump:
+            if obj.get('type') != 'PipeWire:Interface:Node':
+                continue
+            props = (obj.get('info') or {}).get('props') or {}
+            if props.get('media.class') not in STREAM_CLASSES:
+                continue
+            # node.name is what pw-cat --target wants, the serial works too if there is no name
+            target = props.get('node.name') or str(props.get('object.serial', obj.get('id')))
+            self.targets.append(target)
+
+            pid = props.get('application.process.id')
+            if pid is not None:
+                self.by_pid.setdefault(int(pid), target)
+            binary = props.get('application.process.binary')
+            if binary:
+                self.by_binary.setdefault(binary.lower(), target)
+            name = props.get('application.name')
+            if name:
+                self.by_name.setdefault(name.lower(), target)
+
+    def lookup(self, identity=None, desktop_entry=None, pid=None):
+        """
+        Find the stream of a player. Tries the process id first (exact), then the binary / desktop entry,
+        then the application name, then the longest application name that contains the identity
+        (or is contained in it) as whole words.
+        Returns the pw-cat target or None.
+        """
+        if pid is not None and int(pid) in self.by_pid:
+            return self.by_pid[int(pid)]
+        for key in (desktop_entry, identity):
+            if key and key.lower() in self.by_binary:
+                return self.by_binary[key.lower()]
+        if identity:
+            identity = identity.lower()
+            if identity in self.by_name:
+                return self.by_name[identity]
+            # ie. "Mozilla Firefox" vs "Firefox", "VLC media player" vs "VLC media player (LibVLC 3.0.21)"
+            # but not "mpv" vs "mpvpaper". the longest (then alphabetically first) name wins so it doesn't
+            # depend on which stream pw-dump listed first
+            matches = [name for name in self.by_name if _contains_words(identity, name) or _contains_words(name, identity)]
+            if matches:
+                return self.by_name[min(matches, key=lambda name: (-len(name), name))]
+        return None
+
+
+def _contains_words(text, words):
+    """True if words is in text with no letters or digits right before or after it."""
+    return re.search(r'(?<!\w)' + re.escape(words) + r'(?!\w)', text) is not None
+
+
+class PipeWireNodeResolver:
+    """Keeps a PipeWireNodeIndex around, a lookup reads the graph again if it is older than min_refresh."""
+    min_refresh = 2.0
+
+    def __init__(self):
+        self.index = None
+        self.last_refresh = 0.0
+
+    def refresh(self):
+        self.last_refresh = time.monotonic()
+        try:
+            result = subprocess.run(['pw-dump'], capture_output=True, timeout=5, check=True)
+            self.index = PipeWireNodeIndex(json.loads(result.stdout))
+        except (OSError, subprocess.SubprocessError, ValueError) as e:
+            print(f"could not read the pipewire graph: {e}")
+            self.index = PipeWireNodeIndex()
+
+    def resolve(self, identity=None, desktop_entry=None, pid=None):
+        if self.index is None or time.monotonic() - self.last_refresh > self.min_refresh:
+            self.refresh()
+        return self.index.lookup(identity, desktop_entry, pid)
+
+
+resolver = PipeWireNodeResolver()
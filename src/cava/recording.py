@@ -0,0 +1,207 @@
+"""
+gvis - Recording and replaying audio and spectrum frames
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# record_path makes run_cava write every raw pcm chunk and the cava output it turned into
+# to an append only file, so a bad frame or a slowdown can be reproduced exactly.
+#
+# file layout:
+#   64 byte header: magic, version, rate, channels, number_of_bars
+#   records: kind (1 = pcm float32, 2 = frame float64), payload length, timestamp (seconds
+#            since the recording started), then the payload padded to 8 bytes
+# A record with kind 0 (the zeroed space the file grows by) marks the end, so a recording
+# that was cut off by a crash is still readable.
+#
+# Both sides use mmap so writing doesn't go through python file buffering
+# and replaying hands out numpy views straight into the file.
+
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from src.cava.audio_sources import AudioSource
+from src.latency import READ, DSP_DONE, STAMPS
+
+MAGIC = b'GVISREC1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIII')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<BxxxId')
+PCM = 1
+FRAME = 2
+GROW_BY = 4 * 1024 * 1024
+
+
+class Recorder:
+    """Appends timestamped pcm chunks and cava frames to a memory mapped file."""
+
+    def __init__(self, path, rate, channels, number_of_bars):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.size = GROW_BY
+        os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+        self.map[:HEADER.size] = HEADER.pack(MAGIC, VERSION, rate, channels, number_of_bars)
+        self.position = HEADER_SIZE
+        self.start = time.monotonic()
+        print(f"recording to {path}")
+
+    def _append(self, kind, timestamp, array):
+        payload = memoryview(array).cast('B')
+        length = len(payload)
+        padded = (length + 7) // 8 * 8
+        end = self.position + RECORD.size + padded
+        if end + RECORD.size > self.size:
+            self._grow(end + RECORD.size)
+        # payload first, the header last so a reader never sees a record that isn't finished
+        start = self.position + RECORD.size
+        self.map[start:start + length] = payload
+        self.map[self.position:start] = RECORD.pack(kind, length, timestamp - self.start)
+        self.position = end
+
+    def _grow(self, needed):
+        while self.size < needed:
+            self.size += GROW_BY
+        self.map.close()
+        os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def write_pcm(self, timestamp, samples):
+        self._append(PCM, timestamp, samples)
+
+    def write_frame(self, timestamp, frame):
+        self._append(FRAME, timestamp, frame)
+
+    def close(self):
+        self.map.close()
+        os.ftruncate(self.fd, self.position)
+        os.close(self.fd)
+
+
+class Recording:
+    """A recording opened for reading. The records are indexed once when it is opened."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rate, self.channels, self.number_of_bars = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a gvis recording")
+
+        self.pcm = []  # (timestamp, offset, length)
+        self.frames = []
+        position = HEADER_SIZE
+        while position + RECORD.size <= len(self.map):
+            kind, length, timestamp = RECORD.unpack_from(self.map, position)
+            if kind == 0:
+                break
+            start = position + RECORD.size
+            if start + length > len(self.map):
+                break
+            (self.pcm if kind == PCM else self.frames).append((timestamp, start, length))
+            position = start + (length + 7) // 8 * 8
+
+    def pcm_chunk(self, index):
+        timestamp, start, length = self.pcm[index]
+        return timestamp, np.frombuffer(self.map, dtype=np.float32, count=length // 4, offset=start)
+
+    def frame(self, index):
+        timestamp, start, length = self.frames[index]
+        return timestamp, np.frombuffer(self.map, dtype=np.float64, count=length // 8, offset=start)
+
+
+class _Pacer:
+    """Sleeps so recorded timestamps play back at speed x (0 means as fast as possible)."""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.start = None
+
+    def wait(self, timestamp):
+        if self.start is None:
+            self.start = time.monotonic() - timestamp / self.speed if self.speed > 0 else 0
+        if self.speed <= 0:
+            return
+        delay = self.start + timestamp / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplaySource(AudioSource):
+    """Plays the pcm side of a recording back into run_cava (input_source = replay:/path)."""
+    name = 'replay'
+
+    def __init__(self, path, buffer_size, channels, rate, speed=1.0, loop=True, stats=None):
+        super().__init__(buffer_size, channels, rate, stats)
+        self.recording = Recording(path)
+        if self.recording.channels != channels or self.recording.rate != rate:
+            print(f"{path} was recorded at {self.recording.rate}Hz with {self.recording.channels} channels, "
+                  f"gvis is set to {rate}Hz with {channels}")
+        self.loop = loop
+        self.pacer = _Pacer(speed)
+        self.index = 0
+        self.offset = 0  # samples of the current record already handed out
+        self.loop_time = 0.0  # added to timestamps so looping keeps going forward
+
+    def readinto(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        written = 0
+        while written < len(out):
+            if self.index >= len(self.recording.pcm):
+                if not self.loop or not self.recording.pcm:
+                    break
+                self.loop_time += self.recording.pcm[-1][0]
+                self.index = 0
+            timestamp, chunk = self.recording.pcm_chunk(self.index)
+            if self.offset == 0:
+                self.pacer.wait(timestamp + self.loop_time)
+            count = min(len(out) - written, len(chunk) - self.offset)
+            out[written:written + count] = chunk[self.offset:self.offset + count]
+            written += count
+            self.offset += count
+            if self.offset >= len(chunk):
+                self.index += 1
+                self.offset = 0
+        return written * 4
+
+
+def replay_frames(path, update_visualization, number_of_bars, channels, speed=1.0, stop_event=None, postprocess=None,
+                  stats=None):
+    """
+    Feed the recorded cava frames straight to update_visualization, skipping capture and cava.
+    Frames are numpy views into the file so nothing is copied until the mailbox (or postprocess) does.
+    number_of_bars and channels are what gvis is set to, the recording has to have frames of the same size.
+    """
+    recording = Recording(path)
+    if recording.number_of_bars * recording.channels != number_of_bars * channels:
+        # the mailbox, postprocess and the visualizer are all sized for the config
+        print(f"can't replay {path}: it was recorded with {recording.number_of_bars} bars and "
+              f"{recording.channels} channels, gvis is set to {number_of_bars} bars and {channels} channels")
+        return
+    print(f"replaying {len(recording.frames)} frames from {path} at {speed}x")
+    pacer = _Pacer(speed)
+    stamps = np.zeros(STAMPS, dtype=np.float64)
+    for index in range(len(recording.frames)):
+        if stop_event is not None and stop_event.is_set():
+            break
+        timestamp, frame = recording.frame(index)
+        pacer.wait(timestamp)
+        if postprocess is not None:
+            frame = postprocess.process(frame, stats)
+        stamps[READ] = stamps[DSP_DONE] = time.monotonic()
+        update_visualization(frame, stamps)
@@ -1,58 +1,161 @@
-import subprocess
-import selectors
+import time
 import numpy as np
 import ctypes
-from gi.repository import GLib, Gio
-
-def run_cava(input_source, buffer_size, channels, number_of_bars, cava_lib, plan, update_visualization, source):
-    if input_source == "Auto":
-        print("input_source set to Auto. attempting to detect source.")
-        # Get the music app that MPRIS is connected to.
-        identity_variant = source.call_sync(
-            "org.freedesktop.DBus.Properties.Get",
-            GLib.Variant("(ss)", ("org.mpris.MediaPlayer2", "Identity")),
-            Gio.DBusCallFlags.NONE,
-            -1,  # No timeout
-            None  # No cancellable
+from src.cava.audio_sources import open_audio_source
+from src.cava.adaptive_buffer import AdaptiveBufferSize
+from src.cava.recording import Recorder
+from src.cava import pw_nodes
+from src.latency import READ, DSP_DONE, STAMPS
+
+
+class CaptureBuffers:
+    """
+    Preallocated buffers for one cava plan so the capture loop doesn't allocate per chunk.
+
+    pw-cat hands us float32 but cavacore wants float64, so we keep both around and
+    copy between them in place. The output is double buffered, the visualizer gets
+    a view of the buffer that was just written while the next chunk goes into the other one.
+
+    Args:
+        buffer_size (int): size of a read in bytes per channel (same meaning as the config value).
+        channels (int): number of audio channels.
+        number_of_bars (int): number of bars per channel.
+    """
+    def __init__(self, buffer_size, channels, number_of_bars):
+        self.chunk_bytes = buffer_size * channels
+        self.chunk_samples = self.chunk_bytes // 4  # float32
+        self.read_buffer = np.zeros(self.chunk_samples, dtype=np.float32)
+        self.read_view = memoryview(self.read_buffer).cast('B')
+        self.input = np.zeros(self.chunk_samples, dtype=np.float64)
+        self.outputs = (
+            np.zeros(number_of_bars * channels, dtype=np.float64),
+            np.zeros(number_of_bars * channels, dtype=np.float64),
         )
-        app = identity_variant.unpack()[0]
-
-        # Use the app name to get the PipeWire node.name of the music app
-        print(f"detected app: {app}")
-        if app == "Mozilla firefox" or app == "Firefox":
-            input_source = "Firefox"
-        elif app == "VLC media player":
-            input_source = 'VLC media player (LibVLC 3.0.21)'
-        else:
-            print(f"unsupported app {app} falling back to 'auto'")
-            input_source = "auto"
-        print(f"setting audio target to {input_source}")
-
-    # Open pw-cat to stream audio data from the app or microphone.
-    # sometimes of you pause the music pw-cat will crash and will cause the visualizer to hang
-    # TODO: add some kind of timeout or error handling for that
-    process = subprocess.Popen(
-        ["pw-cat", "-ra", "--target", str(input_source), "--format", "f32", "-"],
-        stdout=subprocess.PIPE,
-        bufsize=buffer_size * channels,
-    )
-
-    selector = selectors.DefaultSelector()
+        self.front = 0
+        # when this chunk was read and when cava finished with it (see src/latency.py)
+        self.stamps = np.zeros(STAMPS, dtype=np.float64)
 
-    # Start processing the audio data
-    while True:
-        data = process.stdout.read(buffer_size * channels)
-        if not data:
-            break
-        # Process audio data
-        samples = np.frombuffer(data, dtype=np.float32).astype(np.float64)
-        cava_output = np.zeros((number_of_bars * channels,), dtype=np.float64)
-
-        # Execute Cava visualization
-        cava_lib.cava_execute(
-            samples.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
-            len(samples),
-            cava_output.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
-            plan
+        # ctypes pointers are cached so we dont build new ones every call
+        self.input_ptr = self.input.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        self.output_ptrs = tuple(
+            out.ctypes.data_as(ctypes.POINTER(ctypes.c_double)) for out in self.outputs
         )
-        update_visualization(cava_output)
+
+    def fill(self, stream):
+        """
+        Read one chunk from stream (an audio source) straight into the float32 buffer.
+        Returns the number of samples read (0 on EOF).
+        """
+        read = stream.readinto(self.read_view)
+        if not read:
+            return 0
+        self.stamps[READ] = time.monotonic()
+        samples = read // 4
+        np.copyto(self.input[:samples], self.read_buffer[:samples])
+        return samples
+
+    def execute(self, cava_lib, plan, samples):
+        """Run cava_execute into the back buffer and return it as the new front buffer."""
+        back = self.front ^ 1
+        cava_lib.cava_execute(self.input_ptr, samples, self.output_ptrs[back], plan)
+        self.stamps[DSP_DONE] = time.monotonic()
+        self.front = back
+        return self.outputs[back]
+
+
+def resolve_input_source(input_source, source):
+    """Turn input_source = Auto into a pw-cat target using the app MPRIS is connected to."""
+    if ',' in input_source:
+        # several sources, Auto can be one of them
+        return ','.join(resolve_input_source(name.strip(), source) for name in input_source.split(','))
+    if input_source != "Auto":
+        return input_source
+
+    from gi.repository import GLib, Gio
+    print("input_source set to Auto. attempting to detect source.")
+
+    def get_property(name):
+        try:
+            variant = source.call_sync(
+                "org.freedesktop.DBus.Properties.Get",
+                GLib.Variant("(ss)", ("org.mpris.MediaPlayer2", name)),
+                Gio.DBusCallFlags.NONE,
+                -1,  # No timeout
+                None  # No cancellable
+            )
+            return variant.unpack()[0]
+        except GLib.Error:
+            return None  # DesktopEntry is optional in MPRIS
+
+    # Get the music app that MPRIS is connected to.
+    app = get_property("Identity")
+    desktop_entry = get_property("DesktopEntry")
+    try:
+        pid = source.get_connection().call_sync(
+            "org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+            "GetConnectionUnixProcessID", GLib.Variant("(s)", (source.get_name(),)),
+            None, Gio.DBusCallFlags.NONE, -1, None
+        ).unpack()[0]
+    except GLib.Error:
+        pid = None
+
+    # Use the app name / process to find the PipeWire node of the music app
+    print(f"detected app: {app} (desktop entry: {desktop_entry}, pid: {pid})")
+    input_source = pw_nodes.resolver.resolve(app, desktop_entry, pid)
+    if input_source is None:
+        print(f"could not find a pipewire stream for {app} falling back to 'auto'")
+        input_source = "auto"
+    print(f"setting audio target to {input_source}")
+    return input_source
+
+
+def run_cava(input_source, buffer_size, channels, number_of_bars, cava_lib, plan, update_visualization, source,
+             rate=44100, pacing='realtime', stop_event=None, stats=None, stall_timeout=0.1, restart_after=5.0,
+             adaptive=False, target_latency=30.0, gains=None, record_path=None, replay_speed=1.0,
+             postprocess=None):
+    # the gi import lives in resolve_input_source so this can run on headless boxes without gtk
+    input_source = resolve_input_source(input_source, source)
+    # pw-cat stalls and restarts are handled inside the source, it keeps counters in stats
+    audio = open_audio_source(input_source, buffer_size, channels, rate, pacing, stats, stall_timeout, restart_after,
+                              gains, replay_speed)
+    # every chunk and the frame cava made from it gets written here so it can be replayed later
+    recorder = Recorder(record_path, rate, channels, number_of_bars) if record_path else None
+
+    if stats is None:
+        stats = {}
+    stats['buffer_size'] = buffer_size
+    # watches the pipe backlog and cava_execute time and picks a new buffer_size when needed
+    adaptive_size = AdaptiveBufferSize(buffer_size, channels, rate, target_latency) if adaptive else None
+
+    # everything the loop touches is allocated once here (and again only if adaptive_buffer resizes it)
+    buffers = CaptureBuffers(buffer_size, channels, number_of_bars)
+
+    # Start processing the audio data
+    try:
+        while stop_event is None or not stop_event.is_set():
+            samples = buffers.fill(audio)
+            if not samples:
+                break
+            # Execute Cava visualization
+            execute_start = time.perf_counter()
+            cava_output = buffers.execute(cava_lib, plan, samples)
+            execute_time = time.perf_counter() - execute_start
+            if recorder is not None:
+                recorder.write_pcm(buffers.stamps[READ], buffers.read_buffer[:samples])
+                recorder.write_frame(buffers.stamps[DSP_DONE], cava_output)
+            if postprocess is not None:
+                # smoothing, peaks etc. (a PostProcessor), the recording keeps the raw cava output
+                cava_output = postprocess.process(cava_output, stats)
+            update_visualization(cava_output, buffers.stamps)
+
+            if adaptive_size is not None:
+                new_size = adaptive_size.update(audio.backlog(), execute_time)
+                if new_size is not None:
+                    buffers = CaptureBuffers(new_size, channels, number_of_bars)
+                    stats['buffer_size'] = new_size
+                if adaptive_size.last_latency is not None:
+                    stats['capture_latency_ms'] = round(adaptive_size.last_latency * 1000, 2)
+    finally:
+        audio.close()
+        if recorder is not None:
+            recorder.close()
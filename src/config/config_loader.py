@@ -20,6 +20,7 @@ import os
 import sys
 import configparser
 from src.config.configmaker import create_config
+from src.cava.postprocess import KERNELS as POSTPROCESS_STEPS
 
 def load_config():
     config = configparser.ConfigParser()
@@ -47,6 +48,7 @@ def load_config():
         # this is ugly but I cant think of a better way to do it right now
         # TODO: add more fallbacks
         gvis_config = {
+            'debug': debug,
             'number_of_bars': int(config['gvis']['bars']),
             'rate': int(config['gvis']['rate']),
             'channels': int(config['gvis']['channels']),
@@ -55,8 +57,31 @@ def load_config():
             'low_cut_off': int(config['gvis']['low_cut_off']),
             'high_cut_off': int(config['gvis']['high_cut_off']),
             'buffer_size': int(config['gvis']['buffer_size']),
+            'adaptive_buffer': config.getboolean('gvis', 'adaptive_buffer', fallback=False),
+            'target_latency': config.getfloat('gvis', 'target_latency', fallback=30.0),
+            'spectrum_engine': config.get('gvis', 'spectrum_engine', fallback='auto'),
+            'dsp_process': config.getboolean('gvis', 'dsp_process', fallback=False),
             'input_source': str(config['gvis']['input_source']),
+            'input_gains': config.get('gvis', 'input_gains', fallback=''),
+            'input_pacing': config.get('gvis', 'input_pacing', fallback='realtime'),
+            'stall_timeout': config.getfloat('gvis', 'stall_timeout', fallback=0.1),
+            'stall_restart': config.getfloat('gvis', 'stall_restart', fallback=5.0),
+            'record_path': os.path.expanduser(config.get('gvis', 'record_path', fallback='')),
+            'replay_frames': os.path.expanduser(config.get('gvis', 'replay_frames', fallback='')),
+            'replay_speed': config.getfloat('gvis', 'replay_speed', fallback=1.0),
+            'postprocess': config.get('gvis', 'postprocess', fallback=''),
+            'smoothing': config.getfloat('gvis', 'smoothing', fallback=0.5),
+            'peak_hold': config.getint('gvis', 'peak_hold', fallback=10),
+            'peak_falloff': config.getfloat('gvis', 'peak_falloff', fallback=0.02),
+            'monstercat': config.getfloat('gvis', 'monstercat', fallback=1.5),
+            'eq': config.get('gvis', 'eq', fallback=''),
             'vis_type': str(config['gvis']['vis_type']),
+            'render_backend': config.get('gvis', 'render_backend', fallback='cairo'),
+            'readback_buffers': config.getint('gvis', 'readback_buffers', fallback=0),
+            'shader_cache': config.getboolean('gvis', 'shader_cache', fallback=False),
+            'shader_hot_reload': config.getboolean('gvis', 'shader_hot_reload', fallback=False),
+            'cpu_render_threads': config.getint('gvis', 'cpu_render_threads', fallback=1),
+            'redraw_threshold': config.getfloat('gvis', 'redraw_threshold', fallback=0.001),
             'fill': config.getboolean('gvis', 'fill'),
             'gradient': config.getboolean('gvis', 'gradient'),
             'background_col': config['gvis']['background_col'],
@@ -69,6 +94,15 @@ def load_config():
             'dynamic_scaling': config.getboolean('gvis', 'dynamic_scaling', fallback=False)
         }
 
+        gvis_config['input_gains'] = [float(i) for i in gvis_config['input_gains'].split(',') if i.strip()]
+        gvis_config['postprocess'] = [i.strip() for i in gvis_config['postprocess'].split(',') if i.strip()]
+        unknown_steps = [i for i in gvis_config['postprocess'] if i not in POSTPROCESS_STEPS]
+        if unknown_steps:
+            print(f"Unknown postprocess steps {', '.join(unknown_steps)} ignored, "
+                  f"the ones there are: {', '.join(POSTPROCESS_STEPS)}")
+            gvis_config['postprocess'] = [i for i in gvis_config['postprocess'] if i in POSTPROCESS_STEPS]
+        gvis_config['eq'] = [float(i) for i in gvis_config['eq'].split(',') if i.strip()]
+
         # Parse background color
         background_rgba = gvis_config['background_col'].split(',')
         if len(background_rgba) == 4:
@@ -36,7 +36,24 @@ def create_config():
                           'low_cut_off': 50,
                           'high_cut_off': 10000,
                           'buffer_size': 1200,
+                          'adaptive_buffer': False,
+                          'target_latency': 30,
+                          'spectrum_engine': 'auto',
+                          'dsp_process': False,
                           'input_source': 'Auto',
+                          'input_gains': '',
+                          'input_pacing': 'realtime',
+                          'stall_timeout': 0.1,
+                          'stall_restart': 5.0,
+                          'record_path': '',
+                          'replay_frames': '',
+                          'replay_speed': 1.0,
+                          'postprocess': '',
+                          'smoothing': 0.5,
+                          'peak_hold': 10,
+                          'peak_falloff': 0.02,
+                          'monstercat': 1.5,
+                          'eq': '',
                           'bars': 50,
                           'background_col': '0,0,0,0.5',
                           'color1': '0,1,1,1',
@@ -44,6 +61,12 @@ def create_config():
                           'color_gradient': '1,0,0,1,0,1,0,1,0,0,1,1',
                           'gradient_points': '1,1,1,1',
                           'vis_type': 'bars',
+                          'render_backend': 'cairo',
+                          'readback_buffers': 0,
+                          'shader_cache': False,
+                          'shader_hot_reload': False,
+                          'cpu_render_threads': 1,
+                          'redraw_threshold': 0.001,
                           'fill': True,
                           'scrobble': False,
                           'CustomShader': False,
@@ -0,0 +1,111 @@
+"""
+gvis - Frame handoff between the capture thread and the GTK main loop
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import numpy as np
+from src.latency import STAMPS
+
+
+class FrameMailbox:
+    """
+    Single slot mailbox that only ever holds the newest frame.
+
+    The capture thread posts every frame it makes, the main loop takes whatever is newest when it draws.
+    A frame that gets replaced before it was drawn is counted as dropped.
+    Frames are copied into the mailbox's own buffers so the capture thread can
+    reuse its arrays straight away and the renderer never sees a half written frame.
+
+    Only one redraw is ever pending: post() returns True when the caller should schedule one
+    and False when a redraw is already on its way and will pick up the new frame anyway.
+
+    Once the renderer says the screen is up to date (renderer_idle, see on_draw_common) frames that are
+    within threshold of the last one it drew don't schedule a redraw at all, so silence costs nothing to draw.
+
+    Args:
+        threshold (float): how much any value can change before the frame counts as different.
+    """
+    def __init__(self, threshold=0.0):
+        self._lock = threading.Lock()
+        self._pending = None  # written by post() under the lock
+        self._front = None  # owned by the main loop after take()
+        self._pending_stamps = np.zeros(STAMPS, dtype=np.float64)
+        self._front_stamps = np.zeros(STAMPS, dtype=np.float64)
+        self._has_new = False
+        self.sequence = 0  # sequence number of the last posted frame
+        self.drawn_sequence = 0  # sequence number of the last frame handed to the renderer
+        self.drawn = 0
+        self.dropped = 0
+        self.threshold = threshold
+        self.renderer_idle = False  # set by the renderer when it had nothing new to draw last time
+        self.unchanged = 0  # frames that weren't worth a redraw
+        self._delta = None
+
+    def post(self, frame, stamps=None):
+        """
+        Copy frame (and its latency stamps, if any) into the mailbox.
+        Returns True if a redraw needs to be scheduled.
+        """
+        with self._lock:
+            if self.renderer_idle and not self._has_new and self._front is not None and self._front.shape == frame.shape:
+                # _front is still the frame the renderer drew last
+                if self._delta is None or self._delta.shape != frame.shape:
+                    self._delta = np.empty_like(frame)
+                np.subtract(frame, self._front, out=self._delta)
+                np.abs(self._delta, out=self._delta)
+                if self._delta.max() <= self.threshold:
+                    self.unchanged += 1
+                    return False
+            if self._pending is None or self._pending.shape != frame.shape:
+                self._pending = np.empty_like(frame)
+                self._front = np.empty_like(frame)
+            np.copyto(self._pending, frame)
+            if stamps is not None:
+                np.copyto(self._pending_stamps, stamps)
+            else:
+                self._pending_stamps.fill(0)
+            self.sequence += 1
+            if self._has_new:
+                # the last frame never made it to the screen
+                self.dropped += 1
+                return False
+            self._has_new = True
+            return True
+
+    def take(self):
+        """
+        Get the newest frame for drawing.
+        Returns (sequence, frame, stamps) or None if nothing new was posted since the last take.
+        The frame stays untouched until the next take() so it is safe to render from.
+        """
+        with self._lock:
+            if not self._has_new:
+                return None
+            self._pending, self._front = self._front, self._pending
+            self._pending_stamps, self._front_stamps = self._front_stamps, self._pending_stamps
+            self._has_new = False
+            self.drawn_sequence = self.sequence
+            self.drawn += 1
+            return self.drawn_sequence, self._front, self._front_stamps
+
+    def get_stats(self):
+        return {
+            "posted": self.sequence,
+            "drawn": self.drawn,
+            "dropped": self.dropped,
+            "unchanged": self.unchanged,
+        }
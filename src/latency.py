@@ -0,0 +1,75 @@
+"""
+gvis - Audio to screen latency tracking
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Every frame gets stamped with time.monotonic() when its audio is read, when cava is done with it,
+# when the draw that shows it starts and when that draw has painted.
+# monotonic is used everywhere because it is the same clock in the dsp child process.
+
+import threading
+import numpy as np
+
+# stamp index in the array the capture thread sends along with each frame
+READ = 0
+DSP_DONE = 1
+STAMPS = 2
+
+STAGES = ('read_to_dsp', 'dsp_to_draw', 'draw_to_paint', 'total')
+
+
+class LatencyTracker:
+    """
+    Rolling window of per stage latencies.
+
+    Args:
+        size (int): how many frames the percentiles are taken over.
+    """
+    def __init__(self, size=512):
+        self.size = size
+        self.samples = np.zeros((len(STAGES), size), dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, stamps, draw_start, paint_done):
+        """stamps is the (read, dsp_done) array from the capture thread, times are in seconds."""
+        read = stamps[READ]
+        dsp_done = stamps[DSP_DONE]
+        if read == 0:
+            return  # frame came from somewhere that doesn't stamp
+        with self._lock:
+            column = self.samples[:, self.count % self.size]
+            column[0] = dsp_done - read
+            column[1] = draw_start - dsp_done
+            column[2] = paint_done - draw_start
+            column[3] = paint_done - read
+            self.count += 1
+
+    def percentiles(self):
+        """p50/p95/p99 in milliseconds for every stage."""
+        with self._lock:
+            filled = self.samples[:, :min(self.count, self.size)].copy()
+        if filled.shape[1] == 0:
+            return {}
+        values = np.percentile(filled, (50, 95, 99), axis=1) * 1000
+        return {
+            stage: {
+                "p50": round(float(values[0, i]), 3),
+                "p95": round(float(values[1, i]), 3),
+                "p99": round(float(values[2, i]), 3),
+            }
+            for i, stage in enumerate(STAGES)
+        }
@@ -6,28 +6,97 @@ Contains different visualization types and shared shader loading utilities.
 # I don't really get the point of having an __init__.py file because this is not a package
 # but PEP8 says to have one so here we are
 
-from time import time
-from .bars import BarsVisualizer
-from .lines import LinesVisualizer
-from .shaders import (
-    get_common_fragment_shader,
-    get_bars_vertex_shader, 
-    get_lines_vertex_shader,
-    load_shader,
-    COMMON_FRAGMENT_SHADER,
-    BARS_VERTEX_SHADER,
-    LINES_VERTEX_SHADER
-)
-from .common import (
-    Set_uniforms,
-    initialize_gpu,
-    on_draw_common
-)
+# Nothing is imported here up front anymore. Importing bars and lines pulls in moderngl, and the
+# shader constants read their .glsl files, so gvis only imports the visualizer the config asks for
+# (get_visualizer_class) and the old names below are loaded the first time something uses them.
+#
+# Other packages can add a vis_type through the 'gvis.visualizers' entry point group, e.g. in their
+# pyproject.toml:
+#     [project.entry-points."gvis.visualizers"]
+#     waves = "gvis_waves:WavesVisualizer"
+# the class gets the same arguments as BarsVisualizer.
+
+import importlib
+
+ENTRY_POINT_GROUP = 'gvis.visualizers'
+
+# vis_type -> (module, class name)
+VISUALIZERS = {
+    'bars': ('.bars', 'BarsVisualizer'),
+    'lines': ('.lines', 'LinesVisualizer'),
+}
+
+# old package level names -> the module they live in
+_LAZY_NAMES = {
+    'BarsVisualizer': '.bars',
+    'LinesVisualizer': '.lines',
+    'get_common_fragment_shader': '.shaders',
+    'get_bars_vertex_shader': '.shaders',
+    'get_lines_vertex_shader': '.shaders',
+    'load_shader': '.shaders',
+    'COMMON_FRAGMENT_SHADER': '.shaders',
+    'BARS_VERTEX_SHADER': '.shaders',
+    'LINES_VERTEX_SHADER': '.shaders',
+    'Set_uniforms': '.common',
+    'initialize_gpu': '.common',
+    'on_draw_common': '.common',
+}
+
+_entry_points = None
+
+
+def _plugin_entry_points():
+    """Entry points in the gvis.visualizers group, looked up once (the classes are only loaded when picked)."""
+    global _entry_points
+    if _entry_points is None:
+        _entry_points = {}
+        try:
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError:
+                found = entry_points().get(ENTRY_POINT_GROUP, [])  # python < 3.10
+            for entry_point in found:
+                _entry_points[entry_point.name] = entry_point
+        except Exception as e:
+            print(f"could not look up visualizer plugins: {e}")
+    return _entry_points
+
+
+def available_visualizers():
+    """Every vis_type that can be used, built in ones first."""
+    plugins = [name for name in _plugin_entry_points() if name not in VISUALIZERS]
+    return list(VISUALIZERS) + sorted(plugins)
+
+
+def get_visualizer_class(vis_type):
+    """
+    Import and return the visualizer class for vis_type.
+
+    Raises:
+        ValueError: if no visualizer is registered as vis_type.
+    """
+    if vis_type in VISUALIZERS:
+        module_name, class_name = VISUALIZERS[vis_type]
+        return getattr(importlib.import_module(module_name, __name__), class_name)
+    entry_point = _plugin_entry_points().get(vis_type)
+    if entry_point is None:
+        raise ValueError(f"Unsupported visualization type: {vis_type} (available: {', '.join(available_visualizers())})")
+    return entry_point.load()
+
+
+def __getattr__(name):
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # only look it up once
+    return value
 
 
 __all__ = [
     'BarsVisualizer',
-    'LinesVisualizer', 
+    'LinesVisualizer',
     'get_common_fragment_shader',
     'get_bars_vertex_shader',
     'get_lines_vertex_shader',
@@ -37,5 +106,7 @@ __all__ = [
     'LINES_VERTEX_SHADER',
     'Set_uniforms',
     'initialize_gpu',
-    'on_draw_common'
+    'on_draw_common',
+    'available_visualizers',
+    'get_visualizer_class'
 ]
@@ -21,10 +21,13 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # so because of that I would like someone to review this because it looks very inefficient
 # same applies to lines.py 
 
-import cairo
 import numpy as np
 from .shaders import COMMON_FRAGMENT_SHADER, BARS_VERTEX_SHADER, get_shaders_for_config
-from .common import Set_uniforms, initialize_gpu, on_draw_common
+from .common import Set_uniforms, initialize_gpu, on_draw_common, on_render_common, setup_render_target, setup_cpu_raster, wake_for_reload, BarLOD
+from .program_cache import compile_program
+from .hot_reload import ShaderWatcher
+from .gradient import GradientLUT
+from src.latency import LatencyTracker
 
 try:
     import moderngl
@@ -34,7 +37,7 @@ except ImportError:
     print("ModernGL not available - falling back to CPU rendering")
 
 class BarsVisualizer:
-    def __init__(self, background_col, number_of_bars, fill, gradient, colors_list=None, num_colors=None, gradient_points=None, color=None, config=None, start_time=None):
+    def __init__(self, background_col, number_of_bars, fill, gradient, colors_list=None, num_colors=None, gradient_points=None, color=None, config=None, start_time=None, capture_stats=None, frame_mailbox=None):
         self.background_col = background_col
         self.number_of_bars = number_of_bars
         self.fill = fill
@@ -46,10 +49,25 @@ class BarsVisualizer:
         self.config = config  # Store config for shader loading
         self.sample = None
         self.bar_width = None
-        self.gradient_pattern = None
+        # color_gradient baked once, the GPU samples it as a texture and the CPU fallback reads the table
+        self.gradient_lut = GradientLUT(colors_list) if gradient and colors_list else None
+        self.cpu_heights = None  # bar heights in screen order for the CPU fallback
+        self.cpu_raster = None  # CPURaster for the CPU fallback, made in _initialize_cpu_fallback
         self.widget_width = None
         self.widget_height = None
         self.start_time = start_time
+        self.capture_stats = capture_stats  # pw-cat stall/restart counters from the capture thread
+        self.frame_mailbox = frame_mailbox  # new samples are taken from here at the start of each draw
+        self.sample_sequence = 0
+        self.sample_stamps = None  # latency stamps of a frame that hasn't been painted yet
+        self.painted_draw_start = None  # when the draw of the frame the readback ring just gave back started
+        self.latency = LatencyTracker()
+        # when there are more bars than pixels they get pooled down, drawn_* is what actually gets drawn
+        self.lod = BarLOD(number_of_bars)
+        self.drawn_bars = number_of_bars
+        self.drawn_sample = None
+        self.instance_array = None  # persistent per instance (height, bar_index), see _allocate_instances
+        self.instance_heights = None
 
         # GPU resources
         self.ctx = None
@@ -61,6 +79,25 @@ class BarsVisualizer:
         self.initialized = False
         self.gpu_failed = False
         self.use_gpu = MODERNGL_AVAILABLE
+        self.direct = False  # True when drawing straight into a Gtk.GLArea (render_backend = glarea)
+        self.readback = None  # PixelReadback for the cairo path, made with the framebuffer
+        self.bgra_pass = None  # BGRAPass, converts the frame to cairo's format before it is read back
+        self.framebuffer_pool = None  # FramebufferPool the offscreen framebuffers come from
+        self.render_target = None  # the pooled target render_to_texture draws into (self.texture / self.fbo)
+        self.resize_pending = None  # (size, when) while waiting for a resize to settle
+        self.resize_timer = None  # GLib source of the draw asked for after the wait
+        # what the last drawn frame was drawn from, on_draw_common skips drawing when none of it changed
+        self.painted_surface = None
+        self.painted_sample = None
+        self.painted_state = None
+        self.sample_delta = None
+        self.clean_frames = 0
+        self.skipped_frames = 0
+        self.uniform_table = None  # UniformTable for self.program, made by Set_uniforms
+        self.uniform_ms = 0.0  # rolling average of the time Set_uniforms spends uploading
+        # watches the shader files and recompiles them when they change
+        self.widget = None  # what was drawn on last, the watcher asks it for a frame when there are new shaders
+        self.shader_watcher = ShaderWatcher(config, 'bars', on_change=self.on_shaders_changed) if config and config.get('shader_hot_reload') else None
 
     def _setup_shaders(self, config=None):
         """Set up GPU shaders with flexible loading."""
@@ -72,10 +109,14 @@ class BarsVisualizer:
             vertex_shader = BARS_VERTEX_SHADER
             fragment_shader = COMMON_FRAGMENT_SHADER
         
-        self.program = self.ctx.program(
-            vertex_shader=vertex_shader,
-            fragment_shader=fragment_shader
-        )
+        if config is not None and config.get('shader_cache', False):
+            # goes through the driver's disk cache in ~/.cache/gvis
+            self.program = compile_program(self.ctx, vertex_shader, fragment_shader, debug=config.get('debug', False))
+        else:
+            self.program = self.ctx.program(
+                vertex_shader=vertex_shader,
+                fragment_shader=fragment_shader
+            )
 
     def _setup_buffers(self):
         """Set up GPU buffers."""
@@ -96,13 +137,7 @@ class BarsVisualizer:
             self.ibo = self.ctx.buffer(indices.tobytes())
         
         # Always recreate framebuffer with current dimensions
-        if hasattr(self, 'texture') and self.texture:
-            self.texture.release()
-        if hasattr(self, 'fbo') and self.fbo:
-            self.fbo.release()
-            
-        self.texture = self.ctx.texture((self.widget_width, self.widget_height), 4)
-        self.fbo = self.ctx.framebuffer(self.texture)
+        setup_render_target(self)
 
     
 
@@ -112,7 +147,7 @@ class BarsVisualizer:
         """Initialize CPU fallback rendering."""
         self.widget_width = widget.get_allocated_width()
         self.widget_height = widget.get_allocated_height()
-        self.bar_width = self.widget_width / (self.number_of_bars * 2)
+        self.bar_width = self.widget_width / (self.drawn_bars * 2)
 
         if self.gradient:
             if len(self.gradient_points) != 4:
@@ -130,46 +165,24 @@ class BarsVisualizer:
                 gp1 = float(self.gradient_points[1])
                 gp2 = float(self.gradient_points[2])
                 gp3 = float(self.gradient_points[3])
-            self.gradient_pattern = cairo.LinearGradient(
-                self.widget_height * gp0,
-                self.widget_height * gp1,
-                self.widget_height * gp2,
-                self.widget_height * gp3
-            )
-            for i, color in enumerate(self.colors_list):
-                stop_position = i / (self.num_colors - 1)  # Normalize between 0 and 1
-                self.gradient_pattern.add_color_stop_rgba(stop_position, *color)
+            self.gradient_points = [gp0, gp1, gp2, gp3]
+        setup_cpu_raster(self)
+        self.initialized = True  # or on_draw_common would set it all up again every frame
 
     def update_gpu_data(self):
         """Upload bar height data to GPU."""
         if not self.initialized or self.sample is None:
             return
             
-        # Prepare instance data for each bar - create mirrored layout
-        instance_data = []
-        
-        # Left side bars (reversed order)
-        for i in range(self.number_of_bars):
-            if i < self.number_of_bars:
-                height = self.sample[i]
-                bar_index = float(self.number_of_bars - 1 - i)  # Reverse for left side
-                instance_data.extend([height, bar_index])
-        
-        # Right side bars (normal order)  
-        for i in range(self.number_of_bars):
-            sample_index = self.number_of_bars + i
-            if sample_index < self.number_of_bars * 2:
-                height = self.sample[sample_index]
-                bar_index = float(self.number_of_bars + i)  # Continue from center
-                instance_data.extend([height, bar_index])
-        
-        instance_array = np.array(instance_data, dtype=np.float32)
-        
-        # Update or create instance buffer
-        if hasattr(self, 'instance_vbo'):
-            self.instance_vbo.write(instance_array.tobytes())
-        else:
-            self.instance_vbo = self.ctx.buffer(instance_array.tobytes())
+        bars = self.drawn_bars
+        instance_vbo = getattr(self, 'instance_vbo', None)
+        if self.instance_array is None or len(self.instance_array) != bars * 2:
+            # first frame, or the number of drawn bars changed with the window size
+            self._allocate_instances(bars)
+            if instance_vbo is not None:
+                self.vao.release()
+                instance_vbo.release()
+            self.instance_vbo = self.ctx.buffer(reserve=self.instance_array.nbytes)
             
             # Create VAO with instanced rendering
             self.vao = self.ctx.vertex_array(
@@ -179,6 +192,22 @@ class BarsVisualizer:
                 self.ibo
             )
 
+        # instance i is sample[i] so the heights go in as one copy, the mirroring lives in the bar indices
+        np.copyto(self.instance_heights, self.drawn_sample)
+        self.instance_vbo.write(self.instance_array)
+
+    def _allocate_instances(self, bars):
+        """Make the (height, bar_index) instance array for bars per side. Only the heights change per frame."""
+        self.instance_array = np.zeros((bars * 2, 2), dtype=np.float32)
+        self.instance_heights = self.instance_array[:, 0]
+        # left side counts down to the middle (reversed), right side carries on from the middle
+        self.instance_array[:bars, 1] = np.arange(bars - 1, -1, -1)
+        self.instance_array[bars:, 1] = np.arange(bars, bars * 2)
+
+    def _program_changed(self):
+        """The shaders were reloaded, the VAO is tied to the old program so update_gpu_data makes a new one."""
+        self.instance_array = None
+
     def render_to_texture(self):
         """Render bars to GPU texture."""
         if not self.initialized:
@@ -199,11 +228,11 @@ class BarsVisualizer:
                 self.ctx.enable(moderngl.BLEND)
                 self.ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
                 # Render filled bars
-                self.vao.render(instances=self.number_of_bars * 2)
+                self.vao.render(instances=self.drawn_bars * 2)
             else:
                 # Render as wireframe (outline only)
                 self.ctx.wireframe = True
-                self.vao.render(instances=self.number_of_bars * 2)
+                self.vao.render(instances=self.drawn_bars * 2)
                 self.ctx.wireframe = False
         
         return self.texture
@@ -221,71 +250,61 @@ class BarsVisualizer:
     def on_draw(self, widget, cr):
         return on_draw_common(self, widget, cr)
 
+    def on_render(self, area, gl_context):
+        return on_render_common(self, area, moderngl if MODERNGL_AVAILABLE else None)
+
+    def on_shaders_changed(self):
+        return wake_for_reload(self)
+
     #untested
     def _fallback_cpu_render(self, widget, cr):
         """Fallback to CPU rendering if GPU fails."""
-        # Set the transparent background
-        cr.set_source_rgba(*self.background_col)
-        cr.paint()
-
-        # Draw the bars visualization using CPU
-        if self.sample is not None:
-            bar_width = self.widget_width / (self.number_of_bars * 2)
-            
-            if not self.gradient:
-                cr.set_source_rgba(*self.color)
-            else:
-                # Create gradient pattern for CPU fallback
-                if self.gradient_points and len(self.gradient_points) >= 4:
-                    gp = [float(x) for x in self.gradient_points[:4]]
-                else:
-                    gp = [0, 0, 1, 1]
-                    
-                gradient_pattern = cairo.LinearGradient(
-                    self.widget_height * gp[0],
-                    self.widget_height * gp[1], 
-                    self.widget_height * gp[2],
-                    self.widget_height * gp[3]
-                )
-                
-                for i, color in enumerate(self.colors_list):
-                    stop_position = i / (len(self.colors_list) - 1)
-                    gradient_pattern.add_color_stop_rgba(stop_position, *color)
-                
-                cr.set_source(gradient_pattern)
+        if self.cpu_raster is None or self.cpu_raster.size != (self.widget_width, self.widget_height):
+            # the GPU gave up after it was set up, or the window was resized
+            self._initialize_cpu_fallback(widget)
 
-            # this is bad and awful and I hate it
-            # might rewrite this later but we have cool gpu shaders now so I might not
-            for i, value in enumerate(self.sample):
-                if i < self.number_of_bars:
-                    i = (self.number_of_bars - i)
-                    flip = -1
-                else:
-                    flip = 1
-                if i == self.number_of_bars:
-                    cr.move_to(i * bar_width, self.widget_height * (1 - self.sample[0]))
-                cr.line_to(i * bar_width, self.widget_height * (1 - value))
-                cr.line_to((i + flip) * bar_width, self.widget_height * (1 - value))
+        if self.drawn_sample is None:
+            # Set the transparent background
+            cr.set_source_rgba(*self.background_col)
+            cr.paint()
+            return
 
-                if i == 1 or i == self.number_of_bars * 2 - 1:
-                    cr.line_to((i + flip) * bar_width, self.widget_height)
-                    cr.line_to(widget.get_allocated_width() / 2, self.widget_height)
+        # bars from left to right, the left side is the sample reversed like the GPU's bar indices
+        bars = self.drawn_bars
+        if self.cpu_heights is None or len(self.cpu_heights) != bars * 2:
+            self.cpu_heights = np.zeros(bars * 2, dtype=np.float32)
+        np.copyto(self.cpu_heights[:bars], self.drawn_sample[bars - 1::-1])
+        np.copyto(self.cpu_heights[bars:], self.drawn_sample[bars:])
 
-            if self.fill:
-                cr.fill()
-            else:
-                cr.stroke()
+        cr.set_source_surface(self.cpu_raster.draw_bars(self.cpu_heights, self.fill), 0, 0)
+        cr.paint()
 
     #this looks like it might cause a memory leak.
     #but I dont know enough about openGL and modernGL to know if it does
     def cleanup(self):
         """Clean up GPU resources."""
-        if hasattr(self, 'texture') and self.texture:
-            self.texture.release()
-            self.texture = None
-        if hasattr(self, 'fbo') and self.fbo:
-            self.fbo.release()
-            self.fbo = None
+        self.painted_surface = None
+        # texture and fbo belong to the framebuffer pool (or to GTK with render_backend = glarea)
+        self.texture = None
+        self.fbo = None
+        self.render_target = None
+        if self.readback is not None:
+            self.readback.release()
+            self.readback = None
+        if self.bgra_pass is not None:
+            self.bgra_pass.release()
+            self.bgra_pass = None
+        if self.framebuffer_pool is not None:
+            self.framebuffer_pool.release_all()
+            self.framebuffer_pool = None
+        if self.uniform_table is not None:
+            self.uniform_table.release()
+            self.uniform_table = None
+        if self.cpu_raster is not None:
+            self.cpu_raster.release()
+            self.cpu_raster = None
+        if self.gradient_lut is not None:
+            self.gradient_lut.release()
         if hasattr(self, 'vao') and self.vao:
             self.vao.release()
             self.vao = None
@@ -298,6 +317,7 @@ class BarsVisualizer:
         if hasattr(self, 'instance_vbo') and self.instance_vbo:
             self.instance_vbo.release()
             self.instance_vbo = None
+        self.instance_array = None
         if self.ctx:
             try:
                 self.ctx.release()
@@ -313,5 +333,12 @@ class BarsVisualizer:
             "gpu_initialized": self.initialized and self.use_gpu and not self.gpu_failed,
             "gpu_failed": self.gpu_failed,
             "current_mode": "GPU" if (self.use_gpu and not self.gpu_failed) else "CPU",
-            "context_info": str(self.ctx.info) if self.ctx else "No context"
+            "context_info": str(self.ctx.info) if self.ctx else "No context",
+            "capture": dict(self.capture_stats) if self.capture_stats is not None else {},
+            "frames": self.frame_mailbox.get_stats() if self.frame_mailbox else {},
+            "latency_ms": self.latency.percentiles(),
+            "readback": self.readback.get_stats() if self.readback is not None else {},
+            "framebuffers": self.framebuffer_pool.get_stats() if self.framebuffer_pool is not None else {},
+            "uniforms_ms": round(self.uniform_ms, 4),
+            "skipped_frames": self.skipped_frames
         }
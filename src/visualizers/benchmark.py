@@ -0,0 +1,117 @@
+"""
+gvis - Headless render benchmark
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Renders frames with a visualizer into an offscreen context, no window needed
+# (it tries an EGL context first so it works over ssh / without X).
+# usage (from the project root):
+#   python3 -m src.visualizers.benchmark --vis bars --bars 50 --frames 2000
+#   python3 -m src.visualizers.benchmark --vis lines --width 3840 --height 2160 --readback 2
+#   python3 -m src.visualizers.benchmark --replay /path/to/recording   (frames from a record_path recording)
+
+import argparse
+import time
+import numpy as np
+import moderngl
+
+from src.visualizers.bars import BarsVisualizer
+from src.visualizers.lines import LinesVisualizer
+
+
+def create_context():
+    try:
+        return moderngl.create_context(standalone=True, backend='egl')
+    except Exception:
+        return moderngl.create_context(standalone=True)
+
+
+def make_visualizer(args, ctx):
+    config = {'readback_buffers': args.readback}
+    visualizer_args = dict(
+        background_col=(0, 0, 0, 0.5),
+        number_of_bars=args.bars,
+        fill=True,
+        gradient=True,
+        colors_list=[(1, 0, 0, 1), (0, 1, 0, 1), (0, 0, 1, 1)],
+        num_colors=3,
+        gradient_points=[1, 1, 1, 1],
+        config=config,
+        start_time=time.time(),
+    )
+    visualizer = BarsVisualizer(**visualizer_args) if args.vis == 'bars' else LinesVisualizer(**visualizer_args)
+    # what initialize_gpu does, minus asking a widget for its size
+    visualizer.ctx = ctx
+    visualizer._setup_shaders(config)
+    visualizer.widget_width = args.width
+    visualizer.widget_height = args.height
+    visualizer.drawn_bars = visualizer.lod.resize(args.width)
+    visualizer._setup_buffers()
+    visualizer.initialized = True
+    return visualizer
+
+
+def frames_from(args):
+    if args.replay:
+        from src.cava.recording import Recording
+        recording = Recording(args.replay)
+        return [recording.frame(i)[1] for i in range(len(recording.frames))]
+    rng = np.random.default_rng(0)
+    return [rng.random(args.bars * 2) for _ in range(64)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the gvis visualizers without a window")
+    parser.add_argument('--vis', default='bars', choices=('bars', 'lines'))
+    parser.add_argument('--bars', type=int, default=50)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--readback', type=int, default=0, help="readback_buffers, 0 to wait on every frame")
+    parser.add_argument('--replay', help="take the frames from a record_path recording")
+    args = parser.parse_args()
+
+    ctx = create_context()
+    print(f"renderer: {ctx.info['GL_RENDERER']}")
+    visualizer = make_visualizer(args, ctx)
+    frames = frames_from(args)
+    if len(frames[0]) != args.bars * 2:
+        parser.error(f"the recording has {len(frames[0]) // 2} bars, pass --bars {len(frames[0]) // 2}")
+
+    render_time = 0.0
+    readback_time = 0.0
+    for i in range(args.frames):
+        visualizer.sample = frames[i % len(frames)]
+        visualizer.drawn_sample = visualizer.lod.pool(visualizer.sample)
+        start = time.perf_counter()
+        texture = visualizer.render_to_texture()
+        ctx.finish()
+        middle = time.perf_counter()
+        visualizer.bgra_pass.run(texture)
+        visualizer.readback.read(visualizer.bgra_pass.fbo)
+        end = time.perf_counter()
+        render_time += middle - start
+        readback_time += end - middle
+
+    print(f"[{args.vis}] {args.bars} bars at {args.width}x{args.height} ({visualizer.drawn_bars} drawn per side)")
+    print(f"  render:   {render_time / args.frames * 1000:.4f} ms per frame")
+    print(f"  uniforms: {visualizer.uniform_ms:.4f} ms per frame")
+    print(f"  readback: {readback_time / args.frames * 1000:.4f} ms per frame {visualizer.readback.get_stats()}")
+    visualizer.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,15 @@ Simple common functions for visualizers.
 import time
 import numpy as np
 import cairo
+from gi.repository import GLib
+from .shaders import get_present_shaders
+from .uniforms import UniformTable
+from .program_cache import compile_program
+from .cpu_raster import CPURaster
+from .gradient import GradientLUT, GRADIENT_UNIT
+from src.latency import READ, STAMPS
+
+RESIZE_DEBOUNCE = 0.15  # seconds the size has to stay the same before the framebuffers are remade
 
 def Set_uniforms(self):
     """
@@ -12,98 +21,354 @@ def Set_uniforms(self):
         self: The visualizer instance with attributes:
             - widget_width (float): Width of the widget.
             - widget_height (float): Height of the widget.
-            - number_of_bars (int): Number of bars in the visualizer.
+            - drawn_bars (int): Number of bars drawn per side after pooling.
             - gradient (bool): Whether to use gradient colors.
             - colors_list (list of tuples): List of RGBA color tuples for the gradient.
+            - gradient_lut (GradientLUT): colors_list baked into a lookup table, None without a gradient.
             - gradient_points (list of 4 floats): List of 4 floats defining gradient points.
             - color (tuple): Solid color as an RGBA tuple.
             - program: The shader program object with a dictionary-like interface for uniforms.
+            - uniform_table (UniformTable): made here the first time a program is seen.
     Outputs:
         None. Sets uniforms in the shader program and updates GPU data.
     Currently sets the following uniforms:
         - widget_width (float)
         - widget_height (float)
-        - number_of_bars (int) (the amount of bars (points) in the visualizer)
+        - number_of_bars (int) (the amount of bars (points) drawn per side, see BarLOD)
         - use_gradient (bool)
         - num_gradient_colors (int)
         - gradient_points (tuple of 4 floats)
-        - gradient_color0 to gradient_color7 (tuple of 4 floats)
+        - gradient_lut (sampler2D) (the whole gradient baked into a texture, see gradient.py)
+        - gradient_color0 to gradient_color7 (tuple of 4 floats) (for custom shaders that still use them)
         - solid_color (tuple of 4 floats)
+        - flip_y (float) (-1 when rendering straight into a GLArea)
+        - iTime, avg_height (float) (every frame, through the FrameUniforms block if the shader has one)
+    Uniforms the program doesn't have are skipped and ones that didn't change aren't uploaded again.
     """
+    start = time.perf_counter()
 
     # most of this stuff is from shader toy so that they can be ported easily
+    table = self.uniform_table
+    if table is None or table.program is not self.program:
+        # new program (first frame or shaders were reloaded), look at what it uses once
+        if table is not None:
+            table.release()
+        table = self.uniform_table = UniformTable(self.program)
 
     # Set widget dimensions
-    try:
-        self.program['widget_width'] = float(self.widget_width)
-        self.program['widget_height'] = float(self.widget_height)
-    except KeyError:
-        pass  # Custom shader might not use these uniforms
-    
-    # Set number of bars
-    try:
-        self.program['number_of_bars'] = self.number_of_bars
-    except KeyError:
-        pass  # Custom shader might not use this uniform
-    
+    table.set('widget_width', float(self.widget_width))
+    table.set('widget_height', float(self.widget_height))
+    table.set('iResolution', (float(self.widget_width), float(self.widget_height)))
+
+    # Set number of bars (the number actually drawn, it is less than number_of_bars when they are pooled)
+    table.set('number_of_bars', self.drawn_bars)
 
     # Set gradient uniforms
-    try:
-        if self.gradient and self.colors_list: 
-            self.program['use_gradient'] = True
-            self.program['num_gradient_colors'] = min(len(self.colors_list), 8)
-            
-            # Set gradient points
-            try:
-                if self.gradient_points and len(self.gradient_points) >= 4:
-                    gp = [float(x) for x in self.gradient_points[:4]]
-                    self.program['gradient_points'] = tuple(gp)
-                else:
-                    self.program['gradient_points'] = (0.0, 0.0, 1.0, 1.0)
-            except KeyError:
-                pass  # gradient_points uniform not found (probably optimized out)
-            
-            # Set individual gradient color uniforms
-            for i in range(8):
-                try:
-                    if i < len(self.colors_list):
-                        self.program[f'gradient_color{i}'] = self.colors_list[i]
-                    else:
-                        # Pad with the last color
-                        last_color = self.colors_list[-1] if self.colors_list else (0.0, 0.0, 0.0, 1.0)
-                        self.program[f'gradient_color{i}'] = last_color
-                except KeyError:
-                    pass  # gradient_color uniform not found
+    if self.gradient and self.colors_list:
+        table.set('use_gradient', True)
+        table.set('num_gradient_colors', min(len(self.colors_list), 8))
+
+        # Set gradient points
+        if self.gradient_points and len(self.gradient_points) >= 4:
+            table.set('gradient_points', tuple(float(x) for x in self.gradient_points[:4]))
         else:
-            self.program['use_gradient'] = False
-            self.program['solid_color'] = self.color if self.color else (0.0, 1.0, 1.0, 1.0)
-    except KeyError:
-        # Custom shader doesn't use gradient uniforms, that's fine
-        try:
-            self.program['solid_color'] = self.color if self.color else (0.0, 1.0, 1.0, 1.0)
-        except KeyError:
-            pass  # Custom shader doesn't use solid_color either
+            table.set('gradient_points', (0.0, 0.0, 1.0, 1.0))
 
-    # average the height of the bars
-    try:
-        self.program['avg_height'] = np.mean(self.sample)
-    except KeyError:
-        pass
+        # the baked gradient, one texture fetch per pixel for any number of colours
+        if table.wants('gradient_lut') and self.gradient_lut is not None:
+            self.gradient_lut.texture(self.ctx).use(location=GRADIENT_UNIT)
+            table.set('gradient_lut', GRADIENT_UNIT)
 
-    #Set common uniforms (commonly used in shadertoy shaders)
-    try:
-        self.program['iTime'] = time.time() - self.start_time
-    except KeyError:
-        pass  # Custom shader might not use this uniform
-    try:
-        self.program['iResolution'] = (self.widget_width, self.widget_height)
-    except KeyError:
-        pass # Custom shader might not use this uniform
+        # older custom shaders read the first 8 colours as separate uniforms, padded with the last color
+        for i in range(8):
+            table.set(f'gradient_color{i}', tuple(self.colors_list[min(i, len(self.colors_list) - 1)]))
+    else:
+        table.set('use_gradient', False)
+        table.set('solid_color', tuple(self.color) if self.color else (0.0, 1.0, 1.0, 1.0))
+
+    # a GLArea shows the framebuffer the right way up, the cairo readback shows it upside down
+    table.set('flip_y', -1.0 if self.direct else 1.0)
+
+    #Set common uniforms (commonly used in shadertoy shaders), these change every frame
+    # average the height of the bars (only if the shader actually uses it)
+    avg_height = float(np.mean(self.sample)) if table.wants('avg_height') else 0.0
+    table.set_frame(iTime=time.time() - self.start_time, avg_height=avg_height)
 
+    self.uniform_ms += ((time.perf_counter() - start) * 1000 - self.uniform_ms) * 0.05
 
     # Update GPU data and render
     self.update_gpu_data()
 
+class BarLOD:
+    """
+    Level of detail for lots of bars.
+
+    When there are more bars per side than pixels to draw them in, neighbouring bars are
+    max-pooled together (so peaks don't disappear) and only one bar per pixel gets uploaded and drawn.
+    That way 4096 bars costs about the same as however wide the window is.
+
+    Args:
+        number_of_bars (int): bars per side coming from cava.
+        sides (int): how many sides (channels) the sample has.
+    """
+    def __init__(self, number_of_bars, sides=2):
+        self.number_of_bars = number_of_bars
+        self.sides = sides
+        self.bars = number_of_bars  # bars per side that actually get drawn
+        self.starts = None
+        self.pooled = None
+
+    def resize(self, width):
+        """Work out the pooling for a widget that is width pixels wide. Returns the bars drawn per side."""
+        pixels = max(int(width) // self.sides, 1)
+        if self.number_of_bars <= pixels:
+            self.bars = self.number_of_bars
+            self.starts = None
+            self.pooled = None
+        elif pixels != self.bars:
+            self.bars = pixels
+            # first source bar of every pixel, reduceat pools from each start up to the next one
+            self.starts = (np.arange(pixels) * self.number_of_bars) // pixels
+            self.pooled = np.zeros((self.sides, pixels), dtype=np.float64)
+        return self.bars
+
+    def pool(self, sample):
+        """The sample to draw, sample itself when nothing needs pooling. The pooled array is reused."""
+        if self.starts is None or sample is None:
+            return sample
+        np.maximum.reduceat(sample.reshape(self.sides, self.number_of_bars), self.starts, axis=1, out=self.pooled)
+        return self.pooled.reshape(-1)
+
+class PixelReadback:
+    """
+    Gets the rendered frame from the GPU into memory cairo can paint from.
+
+    With buffers < 2 it reads straight away like texture.read() used to (but into the same bytearray every frame),
+    which makes the CPU wait until the GPU has finished drawing.
+    With 2 or 3 buffers every frame is copied into a pixel buffer object without waiting, and the frame
+    from buffers - 1 draws ago is the one that gets painted. By then the GPU is long done with it so
+    mapping it doesn't stall, at the cost of buffers - 1 frames of extra latency.
+    Until the ring has filled up the very first frame is shown (and waited for).
+    The latency stamps of each frame go round the ring with it, shown holds the ones of the frame that
+    was painted last read (read, dsp_done, draw_start, all 0 if it had none or they were already used).
+
+    Args:
+        ctx: the moderngl context.
+        width, height (int): size of the framebuffer.
+        buffers (int): how many pixel buffers to cycle through (0 or 1 for synchronous reads).
+    """
+    def __init__(self, ctx, width, height, buffers=0):
+        self.size = (width, height)
+        self.viewport = (0, 0, width, height)  # the framebuffer can be bigger than the frame (FramebufferPool)
+        self.data = bytearray(width * height * 4)
+        # made once per size, reads go straight into the memory it paints from
+        self.surface = cairo.ImageSurface.create_for_data(self.data, cairo.FORMAT_ARGB32, width, height, width * 4)
+        self.pbos = [ctx.buffer(reserve=len(self.data)) for _ in range(buffers)] if buffers >= 2 else []
+        self.stamps = np.zeros((len(self.pbos), STAMPS + 1), dtype=np.float64)
+        self.shown = np.zeros(STAMPS + 1, dtype=np.float64)
+        self.frame = 0
+        self.stall_ms = 0.0  # rolling average of how long reads block
+        self.max_stall_ms = 0.0
+
+    def read(self, fbo, stamps=None, draw_start=0.0):
+        """
+        Read a frame from fbo into the surface and return the surface.
+        stamps and draw_start are the latency stamps of the frame in fbo and when its draw started.
+        """
+        start = time.perf_counter()
+        if not self.pbos:
+            fbo.read_into(self.data, viewport=self.viewport, components=4)
+            _keep_stamps(self.shown, stamps, draw_start)
+        else:
+            count = len(self.pbos)
+            # reading into a buffer object only queues the copy on the GPU
+            slot = self.frame % count
+            fbo.read_into(self.pbos[slot], viewport=self.viewport, components=4)
+            _keep_stamps(self.stamps[slot], stamps, draw_start)
+            # the oldest one that was written, until the ring is full that is the very first frame
+            oldest = (self.frame + 1) % count if self.frame >= count - 1 else 0
+            self.pbos[oldest].read_into(self.data)
+            np.copyto(self.shown, self.stamps[oldest])
+            self.stamps[oldest] = 0  # so the first frame isn't counted again while the ring fills up
+        stall = (time.perf_counter() - start) * 1000
+        self.frame += 1
+        self.stall_ms += (stall - self.stall_ms) * 0.05
+        self.max_stall_ms = max(self.max_stall_ms, stall)
+        # cairo has to be told its memory changed behind its back
+        self.surface.mark_dirty()
+        return self.surface
+
+    def get_stats(self):
+        return {
+            "buffers": len(self.pbos) or 1,
+            "stall_ms": round(self.stall_ms, 3),
+            "max_stall_ms": round(self.max_stall_ms, 3),
+        }
+
+    def release(self):
+        for pbo in self.pbos:
+            pbo.release()
+        self.pbos = []
+        self.surface.finish()
+
+def _keep_stamps(out, stamps, draw_start):
+    if stamps is None:
+        out[:] = 0
+    else:
+        out[:STAMPS] = stamps
+        out[STAMPS] = draw_start
+
+class BGRAPass:
+    """
+    Full screen pass that copies the rendered frame into cairo's format (premultiplied BGRA)
+    so it can go from the GPU to a cairo surface with no conversion on the CPU.
+
+    Args:
+        ctx: the moderngl context.
+        pool (FramebufferPool): where its framebuffer comes from.
+    """
+    def __init__(self, ctx, pool):
+        self.ctx = ctx
+        self.pool = pool
+        vertex_shader, fragment_shader = get_present_shaders()
+        self.program = ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self.vao = ctx.vertex_array(self.program, [])
+        self.target = None
+        self.fbo = None
+        self.size = (0, 0)
+
+    def resize(self, width, height):
+        if self.target is not None:
+            self.pool.release(self.target)
+        self.target = self.pool.acquire(width, height)
+        self.fbo = self.target.fbo
+        self.size = (width, height)
+
+    def run(self, scene_texture):
+        """Convert the frame in the bottom left self.size of scene_texture into self.fbo."""
+        self.fbo.use()
+        self.ctx.viewport = (0, 0, *self.size)
+        self.ctx.disable(self.ctx.BLEND)  # a straight copy, the bars pass may have left blending on
+        scene_texture.use(0)
+        self.program['uv_scale'].value = (self.size[0] / scene_texture.width, self.size[1] / scene_texture.height)
+        self.vao.render(vertices=3)
+
+    def release(self):
+        # the framebuffer goes with the pool
+        self.target = None
+        self.fbo = None
+        self.vao.release()
+        self.program.release()
+
+class RenderTarget:
+    """A texture and the framebuffer drawing into it, size is the (rounded up) size it was made with."""
+    def __init__(self, ctx, size):
+        self.size = size
+        self.texture = ctx.texture(size, 4)
+        self.fbo = ctx.framebuffer(self.texture)
+
+    def release(self):
+        self.fbo.release()
+        self.texture.release()
+
+class FramebufferPool:
+    """
+    Render targets rounded up to multiples of bucket pixels, kept around after they are given back.
+
+    Resizing used to release the texture and framebuffer and make new ones every time the size changed.
+    Now anything that fits in the same bucket gets the same target back (only the viewport changes),
+    and going back to a recent size (maximize / unmaximize) reuses the one it had before.
+
+    Args:
+        ctx: the moderngl context.
+        bucket (int): sizes are rounded up to a multiple of this.
+        keep (int): how many unused targets to hold on to, the oldest ones are released after that.
+    """
+    def __init__(self, ctx, bucket=64, keep=2):
+        self.ctx = ctx
+        self.bucket = bucket
+        self.keep = keep
+        self.free = []  # unused targets, oldest first
+        self.in_use = []
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, width, height):
+        size = (-(-max(width, 1) // self.bucket) * self.bucket, -(-max(height, 1) // self.bucket) * self.bucket)
+        for target in reversed(self.free):
+            if target.size == size:
+                self.free.remove(target)
+                self.reuses += 1
+                break
+        else:
+            target = RenderTarget(self.ctx, size)
+            self.allocations += 1
+        self.in_use.append(target)
+        # trimmed here and not in release() so a resize can give back both its targets before taking new ones
+        while len(self.free) > self.keep:
+            self.free.pop(0).release()
+        return target
+
+    def release(self, target):
+        """Give target back so it can be reused."""
+        if target in self.in_use:
+            self.in_use.remove(target)
+            self.free.append(target)
+
+    def release_all(self):
+        for target in self.free + self.in_use:
+            target.release()
+        self.free = []
+        self.in_use = []
+
+    def get_stats(self):
+        return {
+            "allocations": self.allocations,
+            "reuses": self.reuses,
+            "targets": len(self.free) + len(self.in_use),
+        }
+
+def setup_render_target(self):
+    """
+    (Re)make what the visualizer renders into for the current size.
+    Offscreen that is a texture + framebuffer that gets read back for cairo,
+    with render_backend = glarea it is the framebuffer GTK bound for the GLArea.
+    """
+    if self.direct:
+        # not ours, GTK owns it so it must never be released
+        self.texture = None
+        self.fbo = self.ctx.detect_framebuffer()
+        return
+
+    if self.framebuffer_pool is None:
+        self.framebuffer_pool = FramebufferPool(self.ctx)
+    if self.render_target is not None:
+        self.framebuffer_pool.release(self.render_target)
+    if getattr(self, 'readback', None) is not None:
+        self.readback.release()
+
+    # rendering only touches the bottom left widget_width x widget_height of it (render_to_texture sets the viewport)
+    self.render_target = self.framebuffer_pool.acquire(self.widget_width, self.widget_height)
+    self.texture = self.render_target.texture
+    self.fbo = self.render_target.fbo
+    if getattr(self, 'bgra_pass', None) is None:
+        self.bgra_pass = BGRAPass(self.ctx, self.framebuffer_pool)
+    self.bgra_pass.resize(self.widget_width, self.widget_height)
+    buffers = self.config.get('readback_buffers', 0) if self.config else 0
+    self.readback = PixelReadback(self.ctx, self.widget_width, self.widget_height, buffers)
+
+def setup_cpu_raster(self):
+    """
+    Make the framebuffer the CPU fallback draws into, sized to the widget (called again when the size changes).
+    The gradient is worked out here once instead of every frame.
+    """
+    if getattr(self, 'cpu_raster', None) is not None:
+        self.cpu_raster.release()
+    threads = self.config.get('cpu_render_threads', 1) if self.config else 1
+    lut = self.gradient_lut if self.gradient_lut is not None else GradientLUT([self.color or (1, 1, 1, 1)], size=1)
+    self.cpu_raster = CPURaster(self.widget_width, self.widget_height, self.background_col,
+                                lut, self.gradient_points or (0, 0, 1, 1), threads)
+
 def initialize_gpu(self, widget , moderngl):
     """Initialize GPU resources for rendering."""
     if self.gpu_failed or not self.use_gpu:
@@ -171,11 +436,19 @@ def on_draw_common(self, widget, cr):
     Common on_draw function for visualizers.
     This function handles the rendering pipeline for both GPU and CPU rendering.
     """
+    draw_start = time.monotonic()
+    _take_frame(self)
+    self.widget = widget
+
     current_width = widget.get_allocated_width()
     current_height = widget.get_allocated_height()
+
+    # while the window is being resized keep drawing at the old size and stretch it,
+    # everything is only remade once the size has stopped changing for RESIZE_DEBOUNCE
+    stretching = self.initialized and _resizing(self, widget, current_width, current_height)
     
     # Check if we need to reinitialize due to size change
-    if (not self.initialized or 
+    if not stretching and (not self.initialized or 
         self.widget_width != current_width or 
         self.widget_height != current_height):
         
@@ -183,30 +456,89 @@ def on_draw_common(self, widget, cr):
         if (self.widget_width != current_width or 
             self.widget_height != current_height):
             self.initialized = False
-            
+
+        # buffers are sized by the bars actually drawn so this has to be known before initialize
+        self.drawn_bars = self.lod.resize(current_width)
         self.initialize(widget)
-    
+
+    self.drawn_sample = self.lod.pool(self.sample)
+    if self.use_gpu and not self.gpu_failed and self.initialized:
+        reload_shaders(self)
+
+    if stretching:
+        cr.save()
+        cr.scale(current_width / self.widget_width, current_height / self.widget_height)
+    try:
+        if _frame_changed(self):
+            self.painted_surface = _draw_frame(self, widget, cr, draw_start)
+            _remember_frame(self)
+        else:
+            # the surface still holds exactly what would be drawn, just put it up again
+            cr.set_source_surface(self.painted_surface, 0, 0)
+            cr.paint()
+            self.skipped_frames += 1
+    finally:
+        if stretching:
+            cr.restore()
+    _record_latency(self, draw_start)
+
+def _frame_changed(self):
+    """
+    False when drawing again would give the same picture as what painted_surface already has:
+    same size and shaders, no iTime in the shader, and no bar moved more than redraw_threshold.
+    With a readback ring the unchanged frame is drawn until it has come out the other end.
+    Also tells the frame mailbox whether it has to ask for redraws of frames that don't change.
+    """
+    changed = (self.painted_surface is None or self.drawn_sample is None
+               or self.painted_sample is None or self.painted_sample.shape != self.drawn_sample.shape
+               or self.painted_state != (self.widget_width, self.widget_height, self.program, self.gpu_failed)
+               or (self.uniform_table is not None and self.uniform_table.wants('iTime')))
+    if not changed:
+        np.subtract(self.drawn_sample, self.painted_sample, out=self.sample_delta)
+        np.abs(self.sample_delta, out=self.sample_delta)
+        threshold = self.config.get('redraw_threshold', 0.001) if self.config else 0.001
+        changed = self.sample_delta.max() > threshold
+
+    # frames painted from the readback ring are len(pbos) - 1 draws old
+    lag = max(len(self.readback.pbos) - 1, 0) if self.readback is not None and self.use_gpu and not self.gpu_failed else 0
+    self.clean_frames = 0 if changed else self.clean_frames + 1
+    idle = self.clean_frames > lag
+    if self.frame_mailbox is not None:
+        self.frame_mailbox.renderer_idle = idle
+    return not idle
+
+def _remember_frame(self):
+    """Keep what the frame that was just drawn was drawn from, for _frame_changed."""
+    if self.drawn_sample is None:
+        return
+    if self.painted_sample is None or self.painted_sample.shape != self.drawn_sample.shape:
+        self.painted_sample = np.empty_like(self.drawn_sample)
+        self.sample_delta = np.empty_like(self.drawn_sample)
+    np.copyto(self.painted_sample, self.drawn_sample)
+    self.painted_state = (self.widget_width, self.widget_height, self.program, self.gpu_failed)
+
+def _draw_frame(self, widget, cr, draw_start):
+    """Draw a frame at widget_width x widget_height into cr, on the GPU if it can. Returns the surface it painted."""
     # Try GPU rendering first if available
     if self.use_gpu and not self.gpu_failed and self.initialized:
         try:
             gpu_texture = self.render_to_texture()
             
             if gpu_texture is not None:
-                # Read GPU texture data
-                texture_data = gpu_texture.read()
-                
-                # Create Cairo surface from GPU texture
-                cairo_surface = cairo.ImageSurface.create_for_data(
-                    bytearray(texture_data), 
-                    cairo.FORMAT_ARGB32,
-                    self.widget_width, 
-                    self.widget_height
-                )
+                # convert to cairo's pixel format on the GPU, then read it into the
+                # cairo surface (possibly from a frame or two ago, see PixelReadback)
+                self.bgra_pass.run(gpu_texture)
+                cairo_surface = self.readback.read(self.bgra_pass.fbo, self.sample_stamps, draw_start)
+                # with a pbo ring what was just painted is a frame from a few draws ago,
+                # its stamps came out of the ring with it and are the ones to record
+                shown = self.readback.shown
+                self.sample_stamps = shown[:STAMPS] if shown[READ] else None
+                self.painted_draw_start = shown[STAMPS]
                 
                 # Draw the GPU-rendered texture to Cairo context
                 cr.set_source_surface(cairo_surface, 0, 0)
                 cr.paint()
-                return
+                return cairo_surface
         except Exception as e:
             print(f"GPU rendering failed, falling back to CPU: {e}")
             self.gpu_failed = True
@@ -214,3 +546,127 @@ def on_draw_common(self, widget, cr):
     
     # Fallback to CPU rendering
     self._fallback_cpu_render(widget, cr)
+    return self.cpu_raster.surface if self.drawn_sample is not None else None
+
+def _resizing(self, widget, width, height):
+    """True while the widget size is different from what we draw at and was changed less than RESIZE_DEBOUNCE ago."""
+    if (width, height) == (self.widget_width, self.widget_height) or not width or not height:
+        self.resize_pending = None
+        return False
+    now = time.monotonic()
+    if self.resize_pending is None or self.resize_pending[0] != (width, height):
+        # new size, start waiting again. draws normally come in with every frame but make sure
+        # one comes after the wait in case nothing else is drawing (paused)
+        self.resize_pending = ((width, height), now)
+        # only the last size needs its draw, dragging the window edge would otherwise leave a timer per pixel
+        if self.resize_timer is not None:
+            GLib.source_remove(self.resize_timer)
+        self.resize_timer = GLib.timeout_add(int(RESIZE_DEBOUNCE * 1000) + 10, _resize_settled, self, widget)
+        return True
+    if now - self.resize_pending[1] < RESIZE_DEBOUNCE:
+        return True
+    self.resize_pending = None
+    return False
+
+def _resize_settled(self, widget):
+    self.resize_timer = None
+    widget.queue_draw()
+    return False
+
+def on_render_common(self, area, moderngl):
+    """
+    render signal handler for render_backend = glarea.
+    Draws straight into the GLArea's framebuffer with the GLArea's own GL context,
+    so nothing is read back to the CPU. Returns False if it can't, the caller then
+    switches back to a DrawingArea and the cairo path.
+    """
+    draw_start = time.monotonic()
+    _take_frame(self)
+    self.widget = area
+    if moderngl is None or area.get_error() is not None:
+        return False
+
+    # the GLArea framebuffer is in device pixels
+    scale = area.get_scale_factor()
+    current_width = area.get_allocated_width() * scale
+    current_height = area.get_allocated_height() * scale
+    try:
+        if self.ctx is None:
+            # GTK made the area's context current before emitting render
+            self.ctx = moderngl.create_context()
+            self.direct = True
+            self._setup_shaders(self.config)
+            print(f"Rendering straight into a GLArea ({self.ctx.info['GL_RENDERER']})")
+
+        if not self.initialized or self.widget_width != current_width or self.widget_height != current_height:
+            self.widget_width = current_width
+            self.widget_height = current_height
+            self.drawn_bars = self.lod.resize(current_width)
+            self._setup_buffers()
+            self.initialized = True
+
+        self.drawn_sample = self.lod.pool(self.sample)
+        # GTK binds its framebuffer for the area before every render and may swap it out on resize
+        setup_render_target(self)
+        reload_shaders(self)
+        self.render_to_texture()
+    except Exception as e:
+        print(f"GLArea rendering failed, falling back to cairo: {e}")
+        self.fbo = None  # belongs to GTK
+        self.cleanup()
+        self.direct = False
+        self.initialized = False
+        return False
+
+    _record_latency(self, draw_start)
+    return True
+
+def reload_shaders(self):
+    """
+    Swap in shaders the ShaderWatcher has seen change (shader_hot_reload).
+    Runs between frames with the visualizer's context current, if linking fails the old program stays.
+    """
+    if self.shader_watcher is None:
+        return
+    sources = self.shader_watcher.take()
+    if sources is None:
+        return
+    try:
+        if self.config.get('shader_cache', False):
+            program = compile_program(self.ctx, *sources, debug=self.config.get('debug', False))
+        else:
+            program = self.ctx.program(vertex_shader=sources[0], fragment_shader=sources[1])
+    except Exception as e:
+        print(f"shader reload failed, keeping the old shaders: {e}")
+        return
+    old_program, self.program = self.program, program
+    self._program_changed()
+    old_program.release()
+    print("shaders reloaded")
+
+def wake_for_reload(self):
+    """
+    The ShaderWatcher's on_change, runs on the main loop. When nothing is playing the renderer is idle and
+    no frames ask for a redraw, so ask for one here or the new shaders wait for the music to start again.
+    """
+    if self.frame_mailbox is not None:
+        self.frame_mailbox.renderer_idle = False
+    if self.widget is not None:
+        self.widget.queue_draw()
+    return False
+
+def _take_frame(self):
+    """grab the newest frame, it won't change under us until the next draw"""
+    if self.frame_mailbox is not None:
+        new_frame = self.frame_mailbox.take()
+        if new_frame is not None:
+            self.sample_sequence, self.sample, self.sample_stamps = new_frame
+
+def _record_latency(self, draw_start):
+    """Log how long the frame that was just painted took to get here (once per frame, not per redraw)."""
+    if self.sample_stamps is not None:
+        if self.painted_draw_start is not None:
+            draw_start = self.painted_draw_start  # the draw that put it into the readback ring
+        self.latency.record(self.sample_stamps, draw_start, time.monotonic())
+    self.sample_stamps = None
+    self.painted_draw_start = None
@@ -0,0 +1,180 @@
+"""
+gvis - NumPy rasterizer for the CPU fallback
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Used when there is no moderngl or the GPU failed. The old fallback built a cairo path one line_to
+# at a time in python and made a new LinearGradient every frame.
+# Both visualizers draw something that is filled from a height down to the bottom of the window,
+# so every column of pixels is just "fill colour below this row, background above it".
+# The fill (gradient already blended over the background) is worked out once per size, and a frame is
+# one comparison of the row numbers against the per column heights and one multiply, straight into
+# the memory a cairo surface paints from. Same pixel format as the GPU readback (premultiplied BGRA).
+# With cpu_render_threads > 1 the rows are split into bands that are done on a thread pool
+# (numpy lets go of the GIL for the comparison and the multiply).
+
+import cairo
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def premultiplied_bgra(colors):
+    """(..., 4) rgba floats 0-1 -> premultiplied B, G, R, A bytes like cairo's FORMAT_ARGB32 on little endian."""
+    colors = np.clip(np.asarray(colors, dtype=np.float32), 0.0, 1.0)
+    rgb = colors[..., :3] * colors[..., 3:4]
+    return np.round(np.concatenate((rgb[..., ::-1], colors[..., 3:4]), axis=-1) * 255).astype(np.uint8)
+
+
+def gradient_image(width, height, lut, gradient_points):
+    """
+    rgba floats of the gradient at every pixel, worked out the same way common_fragment.glsl does it
+    (and from the same lookup table). gradient_points are (x1, y1, x2, y2) with 0,0 the bottom left.
+    """
+    x1, y1, x2, y2 = (float(point) for point in gradient_points)
+    start = np.array([x1 * width, y1 * height], dtype=np.float32)
+    direction = np.array([(x2 - x1) * width, (y2 - y1) * height], dtype=np.float32)
+    length_sq = float(direction @ direction)
+    # pixel centres, y counted up from the bottom
+    x = np.arange(width, dtype=np.float32) + 0.5
+    y = height - (np.arange(height, dtype=np.float32) + 0.5)
+    if length_sq > 0:
+        t = ((x[None, :] - start[0]) * direction[0] + (y[:, None] - start[1]) * direction[1]) / length_sq
+    else:
+        t = np.zeros((height, width), dtype=np.float32)
+    return lut.sample(t)
+
+
+class CPURaster:
+    """
+    A reusable BGRA framebuffer for one window size.
+
+    Args:
+        width, height (int): size of the window.
+        background_col: rgba of the background.
+        lut (GradientLUT): the fill colours, a table of one entry for a solid colour.
+        gradient_points: (x1, y1, x2, y2) of the gradient, ignored for a solid colour.
+        threads (int): how many threads draw the frame (1 draws it on the calling thread).
+    """
+    def __init__(self, width, height, background_col, lut, gradient_points=(0, 0, 1, 1), threads=1):
+        self.size = (width, height)
+        self.data = bytearray(width * height * 4)
+        # one uint32 per pixel, cairo's own layout
+        self.pixels = np.frombuffer(self.data, dtype=np.uint32).reshape(height, width)
+        self.surface = cairo.ImageSurface.create_for_data(self.data, cairo.FORMAT_ARGB32, width, height, width * 4)
+
+        background = np.asarray(background_col, dtype=np.float32)
+        self.background = premultiplied_bgra(background).view(np.uint32)[0]
+        if len(lut.table) > 1:
+            fill = gradient_image(width, height, lut, gradient_points)
+        else:
+            fill = np.broadcast_to(lut.table[0], (height, width, 4))
+        # blend over the background now (the GPU's SRC_ALPHA, ONE_MINUS_SRC_ALPHA blend) so a frame is only copies
+        alpha = fill[..., 3:4]
+        fill_image = premultiplied_bgra(fill * alpha + background * (1.0 - alpha)).view(np.uint32)[..., 0]
+        # pixel = background + inside * (fill - background), wrapping uint32 maths gives back the exact fill.
+        # a multiply and an add is a lot quicker than a masked copy
+        self.difference = fill_image - self.background
+
+        # per frame buffers
+        self.rows = np.arange(height, dtype=np.float32)[:, None]
+        self.edge = np.zeros(width, dtype=np.float32)  # row where the fill starts in each column
+        self.low = np.zeros(width, dtype=np.float32)
+        self.high = np.zeros(width, dtype=np.float32)
+        self.mask = np.zeros((height, width), dtype=bool)
+        self.outline_mask = np.zeros((height, width), dtype=bool)
+        self.columns = {}  # cached column -> sample lookups per number of values
+
+        threads = max(1, int(threads))
+        step = max(1, -(-height // threads))
+        self.bands = [slice(top, min(top + step, height)) for top in range(0, height, step)] or [slice(0, 0)]
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='gvis-raster') if len(self.bands) > 1 else None
+
+    def _bar_columns(self, count):
+        """Which of count equal width bars each pixel column is in."""
+        key = ('bars', count)
+        if key not in self.columns:
+            width = self.size[0]
+            self.columns[key] = np.minimum((np.arange(width) + 0.5) * count // width, count - 1).astype(np.intp)
+        return self.columns[key]
+
+    def _curve_columns(self, count):
+        """For each pixel column the point to its left and how far along it is to the next (count points spread over the width)."""
+        key = ('curve', count)
+        if key not in self.columns:
+            width = self.size[0]
+            position = (np.arange(width, dtype=np.float32) + 0.5) / width * max(count - 1, 1)
+            left = np.minimum(position.astype(np.intp), max(count - 2, 0))
+            along = np.clip(position - left, 0.0, 1.0).astype(np.float32)
+            self.columns[key] = (left, np.minimum(left + 1, count - 1), along, 1.0 - along, np.zeros(width, dtype=np.float32))
+        return self.columns[key]
+
+    def draw_bars(self, heights, fill=True):
+        """heights (0-1) of equal width bars from left to right. Returns the cairo surface."""
+        np.take(heights, self._bar_columns(len(heights)), out=self.edge)
+        return self._draw(fill)
+
+    def draw_curve(self, heights, fill=True):
+        """heights (0-1) of points spread evenly from the left edge to the right edge, joined by straight lines."""
+        left, right, along, before, scratch = self._curve_columns(len(heights))
+        np.take(heights, left, out=self.edge)
+        self.edge *= before
+        np.take(heights, right, out=scratch)
+        scratch *= along
+        self.edge += scratch
+        return self._draw(fill)
+
+    def _draw(self, fill):
+        width, height = self.size
+        if not width or not height:
+            return self.surface  # not shown yet
+        # heights -> rows, 0 is the top of the window
+        np.multiply(self.edge, -height, out=self.edge)
+        self.edge += height
+        if not fill:
+            # a 2 pixel line: each column covers the rows between its height and the next column's
+            np.minimum(self.edge[:-1], self.edge[1:], out=self.low[:-1])
+            np.maximum(self.edge[:-1], self.edge[1:], out=self.high[:-1])
+            self.low[-1] = self.high[-1] = self.edge[-1]
+            self.low -= 1.0
+            self.high += 1.0
+        if self.pool is None:
+            self._draw_band(self.bands[0], fill)
+        else:
+            for future in [self.pool.submit(self._draw_band, band, fill) for band in self.bands]:
+                future.result()
+        # cairo has to be told its memory changed behind its back
+        self.surface.mark_dirty()
+        return self.surface
+
+    def _draw_band(self, band, fill):
+        rows = self.rows[band]
+        mask = self.mask[band]
+        if fill:
+            np.greater_equal(rows, self.edge, out=mask)
+        else:
+            np.greater_equal(rows, self.low, out=mask)
+            outline = self.outline_mask[band]
+            np.less_equal(rows, self.high, out=outline)
+            mask &= outline
+        pixels = self.pixels[band]
+        np.multiply(self.difference[band], mask, out=pixels)
+        pixels += self.background
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        self.surface.finish()
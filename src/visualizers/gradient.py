@@ -0,0 +1,80 @@
+"""
+gvis - Gradient lookup table
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# color_gradient used to go to the shader as gradient_color0..gradient_color7, so only 8 colours
+# worked and every pixel had to work out which two colours it was between.
+# Now the gradient is baked into a table of LUT_SIZE colours once (the colour stops are spread evenly
+# like before) and goes to the GPU as a LUT_SIZE x 1 texture, so any number of colours is one texture fetch.
+# The CPU fallback samples the exact same table the same way the GPU's linear filtering does.
+
+import numpy as np
+
+LUT_SIZE = 256
+GRADIENT_UNIT = 1  # texture unit the table is bound to (0 is left for the frame in the present pass)
+
+
+def bake_gradient(colors, size=LUT_SIZE):
+    """(size, 4) float32 rgba of the colours spread evenly from 0 to 1 with straight blends between them."""
+    colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+    if len(colors) == 1:
+        return np.repeat(colors, size, axis=0)
+    stops = np.linspace(0.0, 1.0, len(colors))
+    positions = np.linspace(0.0, 1.0, size)
+    return np.stack([np.interp(positions, stops, colors[:, channel]) for channel in range(4)], axis=-1).astype(np.float32)
+
+
+class GradientLUT:
+    """
+    The baked gradient and its texture.
+
+    Args:
+        colors: list of rgba colours (color_gradient), any number of them.
+        size (int): how many entries the table has.
+    """
+    def __init__(self, colors, size=LUT_SIZE):
+        self.colors = [tuple(color) for color in colors]
+        self.table = bake_gradient(self.colors, size)
+        self._texture = None
+        self._ctx = None
+
+    def sample(self, t):
+        """rgba at each t (0-1), an array of shape t.shape + (4,). Blends between entries like GL_LINEAR."""
+        index = np.clip(np.asarray(t, dtype=np.float32), 0.0, 1.0) * (len(self.table) - 1)
+        entries = np.arange(len(self.table), dtype=np.float32)
+        return np.stack([np.interp(index, entries, self.table[:, channel]) for channel in range(4)], axis=-1)
+
+    def texture(self, ctx):
+        """The table as a texture on ctx, made the first time it is asked for (and again for a new context)."""
+        import moderngl
+        if self._texture is None or self._ctx is not ctx:
+            self.release()
+            self._texture = ctx.texture((len(self.table), 1), 4, self.table.tobytes(), dtype='f4')
+            self._texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+            self._texture.repeat_x = False
+            self._texture.repeat_y = False
+            self._ctx = ctx
+        return self._texture
+
+    def release(self):
+        if self._texture is not None:
+            try:
+                self._texture.release()
+            except Exception:
+                pass  # the context it was made on is already gone
+            self._texture = None
+            self._ctx = None
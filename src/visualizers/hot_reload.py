@@ -0,0 +1,111 @@
+"""
+gvis - Shader hot reload
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# With shader_hot_reload = True the shader files the visualizer uses are watched while it runs.
+# When one of them is saved a background thread reads them again and test compiles them in its own
+# standalone context, so a broken shader never gets near the one on screen (the error is just printed).
+# If it compiles, the sources are handed to the visualizer which links them on its own context
+# between two frames and swaps the program (see reload_shaders in common.py).
+# The test compile also warms up the driver shader cache so that second link is quick.
+# on_change is run on the main loop once new shaders are waiting, so they show up even when nothing
+# else would ask for a frame (silence doesn't redraw, see redraw_threshold).
+
+import os
+import threading
+import time
+from gi.repository import GLib
+from .shaders import clear_shader_cache, get_shader_files_for_config, get_shaders_for_config
+
+
+class ShaderWatcher:
+    """
+    Args:
+        config (dict): the gvis config (custom_shader / fragment_shader decide which files are watched).
+        vis_type (str): 'bars' or 'lines'.
+        interval (float): seconds between checks of the files.
+        on_change (callable): run on the main loop when there are new shaders to take.
+    """
+    def __init__(self, config, vis_type, interval=0.5, on_change=None):
+        self.config = config or {}
+        self.vis_type = vis_type
+        self.interval = interval
+        self.on_change = on_change
+        self.paths = get_shader_files_for_config(self.config, vis_type)
+        self.mtimes = self._mtimes()
+        self._lock = threading.Lock()
+        self._pending = None
+        self._ctx = None
+        print(f"watching shaders for changes: {', '.join(str(path) for path in self.paths)}")
+        threading.Thread(target=self._run, name='gvis-shader-watch', daemon=True).start()
+
+    def _mtimes(self):
+        mtimes = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)  # editors sometimes delete and recreate the file on save
+        return mtimes
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            mtimes = self._mtimes()
+            if mtimes == self.mtimes or None in mtimes:
+                continue
+            # let the editor finish writing before reading it
+            time.sleep(0.05)
+            if self._mtimes() != mtimes:
+                continue
+            self.mtimes = mtimes
+            clear_shader_cache()
+            vertex_shader, fragment_shader = get_shaders_for_config(self.config, self.vis_type)
+            if self._validate(vertex_shader, fragment_shader):
+                with self._lock:
+                    self._pending = (vertex_shader, fragment_shader)
+                if self.on_change is not None:
+                    GLib.idle_add(self.on_change)
+
+    def _validate(self, vertex_shader, fragment_shader):
+        """Test compile in a context of our own. True if it linked (or there is no way to check here)."""
+        import moderngl
+        if self._ctx is None:
+            try:
+                try:
+                    self._ctx = moderngl.create_context(standalone=True, backend='egl')
+                except Exception:
+                    self._ctx = moderngl.create_context(standalone=True)
+            except Exception as e:
+                print(f"no context to test compile shaders in ({e}), they will be compiled when swapped in")
+                self._ctx = False
+        if self._ctx is False:
+            return True
+        start = time.perf_counter()
+        try:
+            self._ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader).release()
+        except Exception as e:
+            print(f"shader change doesn't compile, keeping the old shaders:\n{e}")
+            return False
+        print(f"shader change compiled in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return True
+
+    def take(self):
+        """The (vertex, fragment) sources to swap in, or None if nothing changed."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        return pending
@@ -16,10 +16,13 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import cairo
 import numpy as np
 from .shaders import COMMON_FRAGMENT_SHADER, LINES_VERTEX_SHADER, get_shaders_for_config
-from .common import Set_uniforms, initialize_gpu, on_draw_common
+from .common import Set_uniforms, initialize_gpu, on_draw_common, on_render_common, setup_render_target, setup_cpu_raster, wake_for_reload, BarLOD
+from .program_cache import compile_program
+from .hot_reload import ShaderWatcher
+from .gradient import GradientLUT
+from src.latency import LatencyTracker
 
 try:
     import moderngl
@@ -29,7 +32,7 @@ except ImportError:
     print("ModernGL not available - falling back to CPU rendering")
 
 class LinesVisualizer:
-    def __init__(self, background_col, number_of_bars, fill, gradient, colors_list=None, num_colors=None, gradient_points=None, color=None, config=None, start_time=None):
+    def __init__(self, background_col, number_of_bars, fill, gradient, colors_list=None, num_colors=None, gradient_points=None, color=None, config=None, start_time=None, capture_stats=None, frame_mailbox=None):
         self.background_col = background_col
         self.number_of_bars = number_of_bars
         self.fill = fill
@@ -41,10 +44,24 @@ class LinesVisualizer:
         self.config = config  # Store config for shader loading
         self.sample = None
         self.bar_width = None
-        self.gradient_pattern = None
+        # color_gradient baked once, the GPU samples it as a texture and the CPU fallback reads the table
+        self.gradient_lut = GradientLUT(colors_list) if gradient and colors_list else None
+        self.cpu_heights = None  # bar heights in screen order for the CPU fallback
+        self.cpu_raster = None  # CPURaster for the CPU fallback, made in _initialize_cpu_fallback
         self.widget_width = None
         self.widget_height = None
         self.start_time = start_time
+        self.capture_stats = capture_stats  # pw-cat stall/restart counters from the capture thread
+        self.frame_mailbox = frame_mailbox  # new samples are taken from here at the start of each draw
+        self.sample_sequence = 0
+        self.sample_stamps = None  # latency stamps of a frame that hasn't been painted yet
+        self.painted_draw_start = None  # when the draw of the frame the readback ring just gave back started
+        self.latency = LatencyTracker()
+        # when there are more bars than pixels they get pooled down, drawn_* is what actually gets drawn
+        self.lod = BarLOD(number_of_bars)
+        self.drawn_bars = number_of_bars
+        self.drawn_sample = None
+        self.heights_array = None  # persistent (points, vertices_per_point) heights, made in _setup_buffers
 
         # GPU resources
         self.ctx = None
@@ -56,6 +73,25 @@ class LinesVisualizer:
         self.initialized = False
         self.gpu_failed = False
         self.use_gpu = MODERNGL_AVAILABLE
+        self.direct = False  # True when drawing straight into a Gtk.GLArea (render_backend = glarea)
+        self.readback = None  # PixelReadback for the cairo path, made with the framebuffer
+        self.bgra_pass = None  # BGRAPass, converts the frame to cairo's format before it is read back
+        self.framebuffer_pool = None  # FramebufferPool the offscreen framebuffers come from
+        self.render_target = None  # the pooled target render_to_texture draws into (self.texture / self.fbo)
+        self.resize_pending = None  # (size, when) while waiting for a resize to settle
+        self.resize_timer = None  # GLib source of the draw asked for after the wait
+        # what the last drawn frame was drawn from, on_draw_common skips drawing when none of it changed
+        self.painted_surface = None
+        self.painted_sample = None
+        self.painted_state = None
+        self.sample_delta = None
+        self.clean_frames = 0
+        self.skipped_frames = 0
+        self.uniform_table = None  # UniformTable for self.program, made by Set_uniforms
+        self.uniform_ms = 0.0  # rolling average of the time Set_uniforms spends uploading
+        # watches the shader files and recompiles them when they change
+        self.widget = None  # what was drawn on last, the watcher asks it for a frame when there are new shaders
+        self.shader_watcher = ShaderWatcher(config, 'lines', on_change=self.on_shaders_changed) if config and config.get('shader_hot_reload') else None
 
     def _setup_shaders(self, config=None):
         """Set up GPU shaders with flexible loading."""
@@ -67,51 +103,41 @@ class LinesVisualizer:
             vertex_shader = LINES_VERTEX_SHADER
             fragment_shader = COMMON_FRAGMENT_SHADER
         
-        self.program = self.ctx.program(
-            vertex_shader=vertex_shader,
-            fragment_shader=fragment_shader
-        )
+        if config is not None and config.get('shader_cache', False):
+            # goes through the driver's disk cache in ~/.cache/gvis
+            self.program = compile_program(self.ctx, vertex_shader, fragment_shader, debug=config.get('debug', False))
+        else:
+            self.program = self.ctx.program(
+                vertex_shader=vertex_shader,
+                fragment_shader=fragment_shader
+            )
 
     def _setup_buffers(self):
         """Set up GPU buffers."""
-        if self.fill:
-            # For filled mode, create vertices for a triangle strip that forms a filled waveform
-            # We need alternating vertices: bottom points (y=0) and waveform points
-            vertices = []
-            
-            # Create pairs of vertices: baseline and waveform point
-            for i in range(self.number_of_bars * 2):
-                x_pos = i / (self.number_of_bars * 2 - 1)  # Normalize 0 to 1
-                vertices.append(x_pos)  # Waveform point
-                vertices.append(x_pos)  # Baseline point (same x, different y in height data)
-                
-            self.vertices_per_point = 2  # Two vertices per audio sample point
-        else:
-            # For line mode, just create the line points
-            vertices = []
-            for i in range(self.number_of_bars * 2):
-                x_pos = i / (self.number_of_bars * 2 - 1)  # Normalize 0 to 1
-                vertices.append(x_pos)
-                
-            self.vertices_per_point = 1  # One vertex per audio sample point
-        
-        vertices_array = np.array(vertices, dtype=np.float32)
+        # For filled mode every point gets two vertices (waveform and baseline, same x) for a triangle strip
+        # For line mode just the line points
+        self.vertices_per_point = 2 if self.fill else 1
+        points = self.drawn_bars * 2
+        vertices_array = np.repeat(np.linspace(0, 1, points, dtype=np.float32), self.vertices_per_point)
+
+        # heights that get uploaded every frame, the baseline column just stays 0
+        self.heights_array = np.zeros((points, self.vertices_per_point), dtype=np.float32)
         
         # Only create vertex buffer once
         if not hasattr(self, 'vbo') or self.vbo is None:
             self.vbo = self.ctx.buffer(vertices_array.tobytes())
+        elif self.vbo.size != vertices_array.nbytes:
+            # the number of drawn points changed with the window size
+            self.vbo.release()
+            self.vbo = self.ctx.buffer(vertices_array.tobytes())
+            if getattr(self, 'height_vbo', None) is not None:
+                self._rebuild_vao()
         else:
             # Update existing buffer if dimensions changed
             self.vbo.write(vertices_array.tobytes())
         
         # Always recreate framebuffer with current dimensions
-        if hasattr(self, 'texture') and self.texture:
-            self.texture.release()
-        if hasattr(self, 'fbo') and self.fbo:
-            self.fbo.release()
-            
-        self.texture = self.ctx.texture((self.widget_width, self.widget_height), 4)
-        self.fbo = self.ctx.framebuffer(self.texture)
+        setup_render_target(self)
 
     
 
@@ -121,7 +147,7 @@ class LinesVisualizer:
         """Initialize CPU fallback rendering."""
         self.widget_width = widget.get_allocated_width()
         self.widget_height = widget.get_allocated_height()
-        self.bar_width = self.widget_width / (self.number_of_bars * 2)
+        self.bar_width = self.widget_width / (self.drawn_bars * 2)
 
         if self.gradient:
             if len(self.gradient_points) != 4:
@@ -139,15 +165,9 @@ class LinesVisualizer:
                 gp1 = float(self.gradient_points[1])
                 gp2 = float(self.gradient_points[2])
                 gp3 = float(self.gradient_points[3])
-            self.gradient_pattern = cairo.LinearGradient(
-                self.widget_height * gp0,
-                self.widget_height * gp1,
-                self.widget_height * gp2,
-                self.widget_height * gp3
-            )
-            for i, color in enumerate(self.colors_list):
-                stop_position = i / (self.num_colors - 1)  # Normalize between 0 and 1
-                self.gradient_pattern.add_color_stop_rgba(stop_position, *color)
+            self.gradient_points = [gp0, gp1, gp2, gp3]
+        setup_cpu_raster(self)
+        self.initialized = True  # or on_draw_common would set it all up again every frame
 
     def update_gpu_data(self):
         """Upload line point data to GPU."""
@@ -159,51 +179,22 @@ class LinesVisualizer:
             self._last_fill_setting = self.fill
             self._setup_buffers()  # Rebuild buffers with new layout
             
-        # Prepare height data based on rendering mode
-        heights = []
-        
-        if self.fill:
-            # For filled mode, create alternating heights: waveform and baseline
-            # Left side (reversed order)
-            for i in range(self.number_of_bars):
-                if i < self.number_of_bars:
-                    height = self.sample[self.number_of_bars - 1 - i]  # Waveform point
-                    heights.append(height)
-                    heights.append(0.0)  # Baseline point
-            
-            # Right side (normal order)  
-            for sample_index in range(self.number_of_bars):
-                if sample_index < self.number_of_bars:
-                    height = self.sample[sample_index]  # Waveform point
-                    heights.append(height)
-                    heights.append(0.0)  # Baseline point
-        else:
-            # For line mode, just the waveform points
-            # Left side (reversed order)
-            for sample_index in range(self.number_of_bars):
-                if sample_index < self.number_of_bars:
-                    height = self.sample[self.number_of_bars - 1 - sample_index]
-                    heights.append(height)
-            
-            # Right side (normal order)  
-            for sample_index in range(self.number_of_bars):
-                if sample_index < self.number_of_bars:
-                    height = self.sample[sample_index]
-                    heights.append(height)
-        
-        heights_array = np.array(heights, dtype=np.float32)
+        # heights_array was sized for drawn_bars in _setup_buffers (on_draw_common sets it up before initialize)
+        # left side is the sample reversed, right side is it in normal order
+        bars = self.drawn_bars
+        sample = self.drawn_sample
+        np.copyto(self.heights_array[:bars, 0], sample[bars - 1::-1])
+        np.copyto(self.heights_array[bars:, 0], sample[:bars])
         
         # Update or create height buffer
-        if hasattr(self, 'height_vbo'):
-            # Check if buffer size needs to change
-            if len(heights_array) * 4 != self.height_vbo.size:  # 4 bytes per float32
-                self.height_vbo.release()
-                self.height_vbo = self.ctx.buffer(heights_array.tobytes())
-                self._rebuild_vao()
-            else:
-                self.height_vbo.write(heights_array.tobytes())
+        height_vbo = getattr(self, 'height_vbo', None)
+        if height_vbo is not None and height_vbo.size == self.heights_array.nbytes:
+            height_vbo.write(self.heights_array)
         else:
-            self.height_vbo = self.ctx.buffer(heights_array.tobytes())
+            # first frame, or the fill mode / number of drawn points changed
+            if height_vbo is not None:
+                height_vbo.release()
+            self.height_vbo = self.ctx.buffer(self.heights_array)
             self._rebuild_vao()
     
     def _rebuild_vao(self):
@@ -218,6 +209,11 @@ class LinesVisualizer:
              (self.height_vbo, '1f', 'height')]
         )
 
+    def _program_changed(self):
+        """The shaders were reloaded, the VAO is tied to the old program."""
+        if getattr(self, 'height_vbo', None) is not None:
+            self._rebuild_vao()
+
     def render_to_texture(self):
         """Render bars to GPU texture."""
         if not self.initialized:
@@ -260,83 +256,61 @@ class LinesVisualizer:
     def on_draw(self, widget, cr):
         return on_draw_common(self, widget, cr)
 
+    def on_render(self, area, gl_context):
+        return on_render_common(self, area, moderngl if MODERNGL_AVAILABLE else None)
+
+    def on_shaders_changed(self):
+        return wake_for_reload(self)
+
     def _fallback_cpu_render(self, widget, cr):
         """Fallback to CPU rendering if GPU fails."""
-        # Set the transparent background
-        cr.set_source_rgba(*self.background_col)
-        cr.paint()
+        if self.cpu_raster is None or self.cpu_raster.size != (self.widget_width, self.widget_height):
+            # the GPU gave up after it was set up, or the window was resized
+            self._initialize_cpu_fallback(widget)
 
-        # Draw the line visualization using CPU
-        if self.sample is not None:
-            if not self.gradient:
-                cr.set_source_rgba(*self.color)
-            else:
-                # Create gradient pattern for CPU fallback
-                if self.gradient_points and len(self.gradient_points) >= 4:
-                    gp = [float(x) for x in self.gradient_points[:4]]
-                else:
-                    gp = [0, 0, 1, 1]
-                    
-                gradient_pattern = cairo.LinearGradient(
-                    self.widget_height * gp[0],
-                    self.widget_height * gp[1], 
-                    self.widget_height * gp[2],
-                    self.widget_height * gp[3]
-                )
-                
-                for i, color in enumerate(self.colors_list):
-                    stop_position = i / (len(self.colors_list) - 1)
-                    gradient_pattern.add_color_stop_rgba(stop_position, *color)
-                
-                cr.set_source(gradient_pattern)
+        if self.drawn_sample is None:
+            # Set the transparent background
+            cr.set_source_rgba(*self.background_col)
+            cr.paint()
+            return
 
-            # Set line width
-            cr.set_line_width(2.0)
-            
-            # Draw continuous line
-            points_per_side = len(self.sample) // 2
-            
-            # Start from the left side (reversed)
-            first_point = True
-            for i in range(points_per_side):
-                sample_idx = points_per_side - 1 - i  # Reverse for left side
-                if sample_idx < len(self.sample):
-                    x = (i / (points_per_side * 2 - 1)) * self.widget_width
-                    y = self.widget_height * self.sample[sample_idx]  # Remove the (1 - ...)
-                    
-                    if first_point:
-                        cr.move_to(x, y)
-                        first_point = False
-                    else:
-                        cr.line_to(x, y)
-            
-            # Continue to the right side (normal order)
-            for i in range(points_per_side):
-                sample_idx = i
-                if sample_idx < len(self.sample):
-                    x = ((points_per_side + i) / (points_per_side * 2 - 1)) * self.widget_width
-                    y = self.widget_height * self.sample[sample_idx]  # Remove the (1 - ...)
-                    cr.line_to(x, y)
+        # same points as heights_array: left side is the sample reversed, right side is it in normal order
+        bars = self.drawn_bars
+        if self.cpu_heights is None or len(self.cpu_heights) != bars * 2:
+            self.cpu_heights = np.zeros(bars * 2, dtype=np.float32)
+        np.copyto(self.cpu_heights[:bars], self.drawn_sample[bars - 1::-1])
+        np.copyto(self.cpu_heights[bars:], self.drawn_sample[:bars])
 
-            if self.fill:
-                # Close the path for filling
-                cr.line_to(self.widget_width, 0)  # Go to bottom right
-                cr.line_to(0, 0)  # Go to bottom left
-                cr.close_path()
-                cr.fill()
-            else:
-                cr.stroke()
+        # the filled area goes from the line down to the bottom like the GPU draws it
+        cr.set_source_surface(self.cpu_raster.draw_curve(self.cpu_heights, self.fill), 0, 0)
+        cr.paint()
 
     #this looks like it might cause a memory leak.
     #but I dont know enough about openGL and modernGL to know if it does
     def cleanup(self):
         """Clean up GPU resources."""
-        if hasattr(self, 'texture') and self.texture:
-            self.texture.release()
-            self.texture = None
-        if hasattr(self, 'fbo') and self.fbo:
-            self.fbo.release()
-            self.fbo = None
+        self.painted_surface = None
+        # texture and fbo belong to the framebuffer pool (or to GTK with render_backend = glarea)
+        self.texture = None
+        self.fbo = None
+        self.render_target = None
+        if self.readback is not None:
+            self.readback.release()
+            self.readback = None
+        if self.bgra_pass is not None:
+            self.bgra_pass.release()
+            self.bgra_pass = None
+        if self.framebuffer_pool is not None:
+            self.framebuffer_pool.release_all()
+            self.framebuffer_pool = None
+        if self.uniform_table is not None:
+            self.uniform_table.release()
+            self.uniform_table = None
+        if self.cpu_raster is not None:
+            self.cpu_raster.release()
+            self.cpu_raster = None
+        if self.gradient_lut is not None:
+            self.gradient_lut.release()
         if hasattr(self, 'vao') and self.vao:
             self.vao.release()
             self.vao = None
@@ -361,5 +335,12 @@ class LinesVisualizer:
             "gpu_initialized": self.initialized and self.use_gpu and not self.gpu_failed,
             "gpu_failed": self.gpu_failed,
             "current_mode": "GPU" if (self.use_gpu and not self.gpu_failed) else "CPU",
-            "context_info": str(self.ctx.info) if self.ctx else "No context"
+            "context_info": str(self.ctx.info) if self.ctx else "No context",
+            "capture": dict(self.capture_stats) if self.capture_stats is not None else {},
+            "frames": self.frame_mailbox.get_stats() if self.frame_mailbox else {},
+            "latency_ms": self.latency.percentiles(),
+            "readback": self.readback.get_stats() if self.readback is not None else {},
+            "framebuffers": self.framebuffer_pool.get_stats() if self.framebuffer_pool is not None else {},
+            "uniforms_ms": round(self.uniform_ms, 4),
+            "skipped_frames": self.skipped_frames
         }
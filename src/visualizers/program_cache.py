@@ -0,0 +1,128 @@
+"""
+gvis - On disk shader program cache
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# moderngl has no way to make a Program out of a binary (glProgramBinary), so we can't store
+# linked programs ourselves. What we can do is point the driver's own shader disk cache at
+# ~/.cache/gvis/driver (mesa and nvidia both have one and both look it up by the shader source),
+# which gives the same thing: the second launch links custom_fragment.glsl from the cache.
+#
+# The drivers key their caches by their own build as well, so a new driver just misses and
+# recompiles, and they keep the directory's size down themselves. We never delete anything in it
+# (by the time we could ask which driver is there a context exists and the driver has the cache open).
+#
+# manifest.json next to it is only for the debug log: which driver (vendor, renderer, version) it is and
+# a hash of every program linked with it, with how long its first link took to compare the link times to.
+# Whether the driver actually had it cached can't be seen from here (not every driver has a disk cache),
+# the link time is the only hint.
+# It is only written when a program it hasn't seen gets linked. Programs of an older driver are
+# dropped from it and it keeps at most MAX_PROGRAMS (editing a shader with hot reload makes a new one every save).
+
+import hashlib
+import json
+import os
+import time
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'gvis')
+DRIVER_DIR = os.path.join(CACHE_DIR, 'driver')
+MANIFEST = os.path.join(CACHE_DIR, 'manifest.json')
+MAX_PROGRAMS = 64
+
+
+def enable_driver_cache():
+    """
+    Point the GL driver's shader cache at ~/.cache/gvis.
+    Has to run before any GL context is made, the drivers read these when they start.
+    Anything already set in the environment is left alone.
+    """
+    try:
+        # mesa turns its cache off if the directory isn't there
+        os.makedirs(DRIVER_DIR, exist_ok=True)
+    except OSError as e:
+        print(f"could not create the shader cache directory: {e}")
+        return
+    os.environ.setdefault('MESA_SHADER_CACHE_DIR', DRIVER_DIR)
+    os.environ.setdefault('MESA_GLSL_CACHE_DIR', DRIVER_DIR)  # older mesa
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE', '1')
+    os.environ.setdefault('__GL_SHADER_DISK_CACHE_PATH', DRIVER_DIR)
+
+
+def driver_id(ctx):
+    info = ctx.info
+    return f"{info.get('GL_VENDOR')}|{info.get('GL_RENDERER')}|{info.get('GL_VERSION')}"
+
+
+def program_key(ctx, vertex_shader, fragment_shader):
+    """Hash of the sources and the driver they are compiled with."""
+    digest = hashlib.sha256()
+    for part in (driver_id(ctx), vertex_shader, fragment_shader):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _load_manifest():
+    try:
+        with open(MANIFEST, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp = MANIFEST + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temp, MANIFEST)
+    except OSError as e:
+        print(f"could not write the shader cache manifest: {e}")
+
+
+def compile_program(ctx, vertex_shader, fragment_shader, debug=False):
+    """
+    ctx.program() that keeps track of the driver cache.
+    Returns the program, compile errors are raised the same as ctx.program() raises them.
+    With debug the link time is printed.
+    """
+    manifest = _load_manifest()
+    driver = driver_id(ctx)
+    if manifest.get('driver') != driver:
+        # new driver or gpu, none of the programs in there were linked by this one
+        manifest = {'driver': driver, 'programs': {}}
+
+    key = program_key(ctx, vertex_shader, fragment_shader)
+    start = time.perf_counter()
+    program = ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+    link_ms = (time.perf_counter() - start) * 1000
+
+    known = manifest['programs'].get(key)
+    if known is not None:
+        if debug:
+            print(f"shader program linked in {link_ms:.1f} ms (the first link with this driver took {known['first_link_ms']} ms)")
+        return program
+
+    if debug:
+        print(f"shader program linked in {link_ms:.1f} ms (first link with this driver)")
+    programs = manifest['programs']
+    programs[key] = {'first_link_ms': round(link_ms, 2), 'added': time.time()}
+    # oldest ones out first
+    for old in sorted(programs, key=lambda k: programs[k].get('added', 0))[:max(len(programs) - MAX_PROGRAMS, 0)]:
+        del programs[old]
+    _save_manifest(manifest)
+    return program
@@ -68,6 +68,27 @@ def get_lines_vertex_shader() -> str:
     """Get the lines vertex shader source."""
     return get_shader('lines_vertex')
 
+def get_present_shaders() -> tuple:
+    """Get the (vertex, fragment) source of the pass that turns a frame into cairo's pixel format."""
+    return get_shader('present_vertex'), get_shader('present_fragment')
+
+def resolve_custom_shader_path(file_path: str) -> Path:
+    """Where a custom shader path from the config points to."""
+    # Add .glsl extension if not present
+    # NOTE: why did copilot think that this was necessary?
+    if not file_path.endswith('.glsl'):
+        file_path = f"{file_path}.glsl"
+    
+    # Convert to Path object for easier handling
+    shader_path = Path(file_path)
+    
+    # If it's not an absolute path, treat it as relative to project root
+    if not shader_path.is_absolute():
+        # Get project root (assuming we're in src/visualizers/)
+        project_root = Path(__file__).parent.parent.parent
+        shader_path = project_root / shader_path
+    return shader_path
+
 def load_custom_shader(file_path: str) -> str:
     """
     Load a custom shader from any file path.
@@ -82,19 +103,7 @@ def load_custom_shader(file_path: str) -> str:
         FileNotFoundError: If the shader file doesn't exist
         IOError: If there's an error reading the file
     """
-    # Add .glsl extension if not present
-    # NOTE: why did copilot think that this was necessary?
-    if not file_path.endswith('.glsl'):
-        file_path = f"{file_path}.glsl"
-    
-    # Convert to Path object for easier handling
-    shader_path = Path(file_path)
-    
-    # If it's not an absolute path, treat it as relative to project root
-    if not shader_path.is_absolute():
-        # Get project root (assuming we're in src/visualizers/)
-        project_root = Path(__file__).parent.parent.parent
-        shader_path = project_root / shader_path
+    shader_path = resolve_custom_shader_path(file_path)
     
     if not shader_path.exists():
         raise FileNotFoundError(f"Custom shader file not found: {shader_path}")
@@ -171,6 +180,21 @@ def get_shaders_for_config(config: dict, vis_type: str = 'bars'):
     
     return vertex_shader, fragment_shader
 
+def get_shader_files_for_config(config: dict, vis_type: str = 'bars') -> list:
+    """
+    The files get_shaders_for_config reads from (used to watch them for changes).
+    
+    Returns:
+        List of paths, vertex shader first
+    """
+    vertex_path = get_shader_path() / f"{vis_type}_vertex.glsl"
+    if not vertex_path.exists():
+        vertex_path = get_shader_path() / "bars_vertex.glsl"
+    fragment_path = get_shader_path() / "common_fragment.glsl"
+    if config.get('custom_shader', False) and config.get('fragment_shader'):
+        fragment_path = resolve_custom_shader_path(config['fragment_shader'])
+    return [vertex_path, fragment_path]
+
 # For backward compatibility, provide the old constants as module-level variables
 # These will be populated when first accessed via __getattr__
 
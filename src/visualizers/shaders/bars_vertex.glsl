@@ -24,6 +24,7 @@ layout(location = 2) in float bar_index;
 
 uniform float widget_width;
 uniform float widget_height;
+uniform float flip_y; // -1 when drawing straight into a GLArea, the cairo path flips the image itself
 uniform int number_of_bars;
 
 out float v_height;
@@ -39,7 +40,7 @@ void main() {
     
     // Convert to normalized device coordinates
     gl_Position = vec4((final_pos.x / widget_width) * 2.0 - 1.0, 
-                      1.0 - (final_pos.y / widget_height) * 2.0, 
+                      (1.0 - (final_pos.y / widget_height) * 2.0) * flip_y, 
                       0.0, 1.0);
     
     v_height = height;
@@ -16,9 +16,12 @@
 #version 330 core
 in float v_height;
 
-uniform float iTime;
 uniform vec2 iResolution;
-uniform float avg_height;
+// both change every frame, gvis uploads them in one go when they are in this block
+layout(std140) uniform FrameUniforms {
+    float iTime;
+    float avg_height;
+};
 
 
 vec3 palette(float d){
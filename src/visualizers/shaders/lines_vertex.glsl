@@ -23,6 +23,7 @@ layout(location = 1) in float height;
 
 uniform float widget_width;
 uniform float widget_height;
+uniform float flip_y; // -1 when drawing straight into a GLArea, the cairo path flips the image itself
 
 out float v_height;
 out vec2 v_position;
@@ -34,7 +35,7 @@ void main() {
     
     // Convert to normalized device coordinates
     gl_Position = vec4((final_pos.x / widget_width) * 2.0 - 1.0, 
-                      1.0 - (final_pos.y / widget_height) * 2.0, 
+                      (1.0 - (final_pos.y / widget_height) * 2.0) * flip_y, 
                       0.0, 1.0);
     
     v_height = height;
@@ -0,0 +1,34 @@
+/*
+ * gvis - Present fragment shader
+ * Copyright (C) 2025 mrhooman
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#version 330 core
+
+// last pass before the frame is read back for cairo.
+// cairo's FORMAT_ARGB32 is premultiplied and (on little endian) stored as B, G, R, A bytes,
+// so swap red and blue and multiply by alpha here instead of on the cpu
+
+in vec2 v_uv;
+
+uniform sampler2D scene;
+
+out vec4 fragment_color;
+
+void main() {
+    vec4 color = texture(scene, v_uv);
+    fragment_color = vec4(color.bgr * color.a, color.a);
+}
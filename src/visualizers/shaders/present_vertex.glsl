@@ -0,0 +1,32 @@
+/*
+ * gvis - Present vertex shader
+ * Copyright (C) 2025 mrhooman
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#version 330 core
+
+// one triangle that covers the whole screen, no vertex buffer needed
+
+out vec2 v_uv;
+
+// the frame only fills the bottom left of the texture when it came from a bigger pooled framebuffer
+uniform vec2 uv_scale;
+
+void main() {
+    vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    v_uv = corner * uv_scale;
+    gl_Position = vec4(corner * 2.0 - 1.0, 0.0, 1.0);
+}
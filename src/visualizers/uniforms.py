@@ -0,0 +1,89 @@
+"""
+gvis - Uniform uploads with change tracking
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Set_uniforms used to upload every uniform every frame, each one in its own try/except KeyError
+# because custom shaders only declare what they use.
+# The program is now looked at once after it links: every active uniform goes in a table and
+# set() only uploads when the value is different from the last one it uploaded.
+# Widget size, colours and the gradient end up being uploaded once (and again on resize).
+#
+# The values that change every frame (iTime, avg_height) can also come in as a uniform block,
+# a shader that declares
+#     layout(std140) uniform FrameUniforms { float iTime; float avg_height; };
+# gets both in a single buffer write.
+
+import numpy as np
+
+FRAME_BLOCK = 'FrameUniforms'
+FRAME_FIELDS = ('iTime', 'avg_height')  # std140 order in the block, one float each
+FRAME_BINDING = 0
+
+
+class UniformTable:
+    """
+    Active uniforms of a linked program.
+
+    Args:
+        program: the moderngl program.
+    """
+    def __init__(self, program):
+        import moderngl
+        self.program = program
+        self.uniforms = {}
+        self.values = {}
+        self.frame_buffer = None
+        for name in program:
+            member = program[name]
+            if isinstance(member, moderngl.Uniform):
+                self.uniforms[name] = member
+            elif isinstance(member, moderngl.UniformBlock) and name == FRAME_BLOCK:
+                member.binding = FRAME_BINDING
+                # std140 rounds the block up to 16 bytes
+                self.frame_values = np.zeros(4, dtype=np.float32)
+                self.frame_buffer = program.ctx.buffer(reserve=self.frame_values.nbytes)
+
+    def wants(self, name):
+        """True if the program reads name (as a plain uniform or through FrameUniforms)."""
+        return name in self.uniforms or (self.frame_buffer is not None and name in FRAME_FIELDS)
+
+    def set(self, name, value):
+        """Upload value if the program has the uniform and it changed since the last upload."""
+        uniform = self.uniforms.get(name)
+        if uniform is None or self.values.get(name) == value:
+            return
+        uniform.value = value
+        self.values[name] = value
+
+    def set_frame(self, **values):
+        """Per frame values, written to the FrameUniforms block if there is one."""
+        if self.frame_buffer is None:
+            for name, value in values.items():
+                uniform = self.uniforms.get(name)
+                if uniform is not None:
+                    uniform.value = value
+            return
+        for i, name in enumerate(FRAME_FIELDS):
+            if name in values:
+                self.frame_values[i] = values[name]
+        self.frame_buffer.write(self.frame_values)
+        self.frame_buffer.bind_to_uniform_block(FRAME_BINDING)
+
+    def release(self):
+        if self.frame_buffer is not None:
+            self.frame_buffer.release()
+            self.frame_buffer = None
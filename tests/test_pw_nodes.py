@@ -0,0 +1,101 @@
+"""
+gvis - Tests for the PipeWire node lookup
+Copyright (C) 2025 mrhooman
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# fixtures/pw-dump.json is a trimmed pw-dump with firefox, vlc and mpv playing (and pw-cat recording)
+
+import json
+import os
+import subprocess
+import pytest
+from src.cava import pw_nodes
+from src.cava.pw_nodes import PipeWireNodeIndex, PipeWireNodeResolver
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'pw-dump.json')
+
+
+@pytest.fixture
+def index():
+    return PipeWireNodeIndex.from_file(FIXTURE)
+
+
+def test_only_output_streams_are_indexed(index):
+    assert index.targets == ['Firefox', 'VLC media player (LibVLC 3.0.21)', 'mpv']
+
+
+def test_lookup_by_pid(index):
+    assert index.lookup('Something else entirely', pid=5151) == 'mpv'
+    # the pid wins over the name
+    assert index.lookup('Firefox', pid=5151) == 'mpv'
+
+
+def test_lookup_by_binary(index):
+    assert index.lookup('Mozilla Firefox', desktop_entry='firefox') == 'Firefox'
+    assert index.lookup('vlc') == 'VLC media player (LibVLC 3.0.21)'
+
+
+def test_lookup_by_fuzzy_name(index):
+    # MPRIS says "VLC media player", pipewire has the libvlc version on the end
+    assert index.lookup('VLC media player') == 'VLC media player (LibVLC 3.0.21)'
+    assert index.lookup('Mozilla Firefox') == 'Firefox'
+    # only whole words count
+    assert index.lookup('mpvpaper') is None
+
+
+def stream(node_name, app_name):
+    return {'type': 'PipeWire:Interface:Node',
+            'info': {'props': {'media.class': 'Stream/Output/Audio', 'node.name': node_name, 'application.name': app_name}}}
+
+
+def test_fuzzy_lookup_takes_the_longest_match():
+    dump = [stream('music', 'Music'), stream('music-player', 'Music Player')]
+    assert PipeWireNodeIndex(dump).lookup('Music Player Daemon') == 'music-player'
+    assert PipeWireNodeIndex(dump[::-1]).lookup('Music Player Daemon') == 'music-player'
+
+
+def test_lookup_miss(index):
+    assert index.lookup('Spotify', desktop_entry='spotify', pid=1) is None
+
+
+def test_refresh_is_throttled(monkeypatch):
+    with open(FIXTURE, 'rb') as f:
+        dump = f.read()
+    # same binary, new pid and node name, like a player that was restarted
+    restarted = json.dumps([stream('mpv.2', 'mpv')]).encode('utf-8')
+    dumps = [dump, restarted]
+    calls = []
+
+    def fake_pw_dump(*args, **kwargs):
+        calls.append(args)
+        return subprocess.CompletedProcess(args, 0, stdout=dumps[min(len(calls), len(dumps)) - 1])
+
+    now = [100.0]
+    monkeypatch.setattr(pw_nodes.subprocess, 'run', fake_pw_dump)
+    monkeypatch.setattr(pw_nodes.time, 'monotonic', lambda: now[0])
+    resolver = PipeWireNodeResolver()
+
+    # the first lookup takes the snapshot, more right after it don't run pw-dump again
+    assert resolver.resolve('Firefox') == 'Firefox'
+    now[0] += resolver.min_refresh / 2
+    assert resolver.resolve('mpv') == 'mpv'
+    assert resolver.resolve('Spotify') is None
+    assert len(calls) == 1
+
+    # once min_refresh has passed any lookup reads the graph again and finds the new stream
+    now[0] += resolver.min_refresh
+    assert resolver.resolve('mpv') == 'mpv.2'
+    assert len(calls) == 2